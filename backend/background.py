@@ -0,0 +1,201 @@
+"""Supervised background jobs that survive graceful shutdown
+
+Endpoints hand work to task_supervisor.spawn() by job name instead of using
+BackgroundTasks. At most BACKGROUND_TASK_CONCURRENCY jobs run at once; the rest
+wait their turn. Once a worker starts draining (SIGTERM, or lifespan shutdown
+when run without runner.py) no new job is started. Running jobs get until
+BACKGROUND_DRAIN_TIMEOUT seconds after the drain began to finish; anything still
+running or waiting then is cancelled and checkpointed to Mongo. Every worker
+replays checkpoints every BACKGROUND_REPLAY_INTERVAL seconds, so jobs a deploy
+interrupted resume on the workers that replace it.
+
+A replayed job starts over, so jobs must be safe to run twice.
+"""
+import os
+import time
+import socket
+import asyncio
+import contextvars
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS = "background_checkpoints"
+
+
+class TaskSupervisor:
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        drain_timeout: Optional[float] = None,
+        replay_interval: Optional[float] = None
+    ):
+        self.concurrency = concurrency or int(os.getenv("BACKGROUND_TASK_CONCURRENCY", "32"))
+        # Counted from SIGTERM, so keep it under runner.py's GRACEFUL_TIMEOUT + 5s kill deadline
+        self.drain_timeout = drain_timeout if drain_timeout is not None else float(os.getenv("BACKGROUND_DRAIN_TIMEOUT", "25"))
+        # Stripe rejects webhook signatures older than five minutes, so replay well within that
+        self.replay_interval = replay_interval or float(os.getenv("BACKGROUND_REPLAY_INTERVAL", "30"))
+        # A job interrupted by this many deploys in a row is dropped instead of replayed again
+        self.max_attempts = int(os.getenv("BACKGROUND_MAX_ATTEMPTS", "3"))
+        self.jobs: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.counters = {"spawned": 0, "completed": 0, "failed": 0, "checkpointed": 0, "replayed": 0, "dropped": 0}
+        self._drain_started: Optional[float] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[asyncio.Task, Dict[str, Any]] = {}
+        self._deferred: List[Dict[str, Any]] = []
+        self._replay_task: Optional[asyncio.Task] = None
+        self._drain_listeners: List[Callable[[], None]] = []
+
+    @property
+    def draining(self) -> bool:
+        return self._drain_started is not None
+
+    def add_drain_listener(self, listener: Callable[[], None]) -> None:
+        """Called once when draining begins, e.g. to fail readiness while the worker drains"""
+        self._drain_listeners.append(listener)
+
+    def register(self, name: str, job: Callable[..., Awaitable[Any]]) -> None:
+        self.jobs[name] = job
+
+    def start(self, database: AsyncIOMotorDatabase) -> None:
+        self.db = database
+        self._drain_started = None
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._replay_task = asyncio.create_task(self._replay_loop())
+
+    def spawn(self, name: str, *args: Any, **kwargs: Any) -> None:
+        """Run a registered job in the background; arguments must be storable in Mongo"""
+        if name not in self.jobs:
+            raise KeyError(f"Unknown background job {name}")
+        self.counters["spawned"] += 1
+        self._launch({"name": name, "args": list(args), "kwargs": kwargs, "attempts": 0})
+
+    def _launch(self, job: Dict[str, Any]) -> None:
+        if self.draining:
+            self._deferred.append(job)
+            return
+        # A fresh context, so jobs spawned from a request don't inherit its deadline or pymongo timeout
+        task = asyncio.create_task(self._run(job), context=contextvars.Context())
+        self._tasks[task] = job
+        task.add_done_callback(self._tasks.pop)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        async with self._semaphore:
+            if self.draining:
+                # Never started, so another worker can have it without it counting as an attempt
+                self._deferred.append(job)
+                job["done"] = True
+                return
+            job["started"] = True
+            try:
+                await self.jobs[job["name"]](*job["args"], **job["kwargs"])
+                self.counters["completed"] += 1
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.error(f"Background job {job['name']} failed: {str(e)}")
+            job["done"] = True
+
+    def begin_drain(self) -> None:
+        """Stop starting jobs; called from the SIGTERM handler so the drain deadline runs from there"""
+        if self._drain_started is None:
+            self._drain_started = time.monotonic()
+            logger.info(f"Draining background jobs: {sum(1 for job in self._tasks.values() if job.get('started'))} running")
+            for listener in self._drain_listeners:
+                listener()
+
+    async def drain(self) -> None:
+        """Wait for running jobs until the deadline, then cancel and checkpoint whatever is left"""
+        self.begin_drain()
+        if self._replay_task:
+            self._replay_task.cancel()
+            await asyncio.gather(self._replay_task, return_exceptions=True)
+            self._replay_task = None
+
+        running = [task for task, job in self._tasks.items() if job.get("started")]
+        remaining = self._drain_started + self.drain_timeout - time.monotonic()
+        if running and remaining > 0:
+            await asyncio.wait(running, timeout=remaining)
+
+        leftover = list(self._tasks.items())
+        for task, _ in leftover:
+            task.cancel()
+        await asyncio.gather(*(task for task, _ in leftover), return_exceptions=True)
+
+        interrupted = [job for _, job in leftover if not job.get("done")]
+        for job in interrupted:
+            if job.get("started"):
+                job["attempts"] += 1
+        await self._checkpoint(self._deferred + interrupted)
+        self._deferred = []
+
+    async def _checkpoint(self, jobs: List[Dict[str, Any]]) -> None:
+        if not jobs:
+            return
+        now = datetime.utcnow()
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        docs = [
+            {
+                "name": job["name"],
+                "args": job["args"],
+                "kwargs": job["kwargs"],
+                "attempts": job["attempts"],
+                "checkpointed_at": now,
+                "owner": owner
+            }
+            for job in jobs
+        ]
+        try:
+            await self.db[CHECKPOINTS].insert_many(docs, ordered=False)
+            self.counters["checkpointed"] += len(docs)
+            logger.info(f"Checkpointed {len(docs)} background jobs for replay")
+        except Exception as e:
+            names = ", ".join(sorted({job["name"] for job in jobs}))
+            logger.error(f"Failed to checkpoint {len(docs)} background jobs ({names}): {str(e)}")
+
+    async def replay(self) -> int:
+        """Claim checkpointed jobs one at a time and run them here"""
+        replayed = 0
+        while not self.draining:
+            doc = await self.db[CHECKPOINTS].find_one_and_delete({}, sort=[("checkpointed_at", 1)])
+            if doc is None:
+                break
+            if doc["name"] not in self.jobs:
+                self.counters["dropped"] += 1
+                logger.error(f"Dropping checkpointed background job {doc['name']}: no such job")
+                continue
+            if doc.get("attempts", 0) >= self.max_attempts:
+                self.counters["dropped"] += 1
+                logger.error(f"Dropping checkpointed background job {doc['name']} after {doc['attempts']} interrupted attempts")
+                continue
+            self._launch({"name": doc["name"], "args": doc["args"], "kwargs": doc["kwargs"], "attempts": doc.get("attempts", 0)})
+            replayed += 1
+
+        if replayed:
+            self.counters["replayed"] += replayed
+            logger.info(f"Replaying {replayed} checkpointed background jobs")
+        return replayed
+
+    async def _replay_loop(self) -> None:
+        while True:
+            try:
+                await self.replay()
+            except Exception as e:
+                logger.error(f"Background job replay failed: {str(e)}")
+            await asyncio.sleep(self.replay_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        running = sum(1 for job in self._tasks.values() if job.get("started"))
+        return {
+            "running": running,
+            "waiting": len(self._tasks) - running,
+            "deferred": len(self._deferred),
+            "draining": self.draining,
+            **self.counters
+        }
+
+
+task_supervisor = TaskSupervisor()
@@ -0,0 +1,41 @@
+"""Publish a prompt catalog file
+
+    python catalog_import.py catalog.json [--prune] [--dry-run]
+
+The file is a JSON array of prompts, {"prompts": [...]}, or NDJSON; every prompt
+needs a stable id. Only new and changed prompts are written. Running API workers
+notice the new catalog version within PROMPT_CATALOG_VERSION_CHECK_INTERVAL seconds.
+"""
+import os
+import json
+import asyncio
+import argparse
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from services.catalog_import_service import CatalogImportService, parse_catalog
+import logging
+
+load_dotenv()
+
+
+async def main(args: argparse.Namespace) -> None:
+    with open(args.file, "rb") as f:
+        records = parse_catalog(f.read())
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    try:
+        service = CatalogImportService(client.bizpromptai)
+        await service.ensure_indexes()
+        summary = await service.import_catalog(records, prune=args.prune, dry_run=args.dry_run)
+        print(json.dumps(summary, indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a prompt catalog")
+    parser.add_argument("file", help="JSON or NDJSON catalog of prompts")
+    parser.add_argument("--prune", action="store_true", help="Delete stored prompts missing from the file")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,181 @@
+"""Versioned, memory-mapped snapshots of the serialized prompt catalog, shared by all workers
+
+One worker serializes the catalog into a generation file; every worker maps it
+read-only and serves slices of the mapping, so memory stays flat as workers are
+added. Generation file layout:
+
+    MAGIC | uint32 index length | JSON index {"generation", "built_at", "entries": {key: [offset, length]}} | bodies
+
+Entry offsets are relative to the start of the bodies.
+
+The CURRENT file names the live generation and is swapped with os.replace, so a
+reader sees either the old generation or the new one, never a partial file.
+"""
+import os
+import json
+import mmap
+import time
+import struct
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, Union
+from starlette.responses import Response
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process snapshot, callers fall back to per-process caches
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BPCAT001"
+HEADER = struct.Struct("<8sI")
+POINTER = "CURRENT"
+LOCK = "build.lock"
+
+
+def snapshot_key(tier: str, category: Optional[str]) -> str:
+    return f"{tier}|{category or ''}"
+
+
+class CatalogSnapshot:
+    """A read-only mapping of one generation file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a catalog snapshot: {path}")
+        index = json.loads(self._mmap[HEADER.size:HEADER.size + index_length])
+        self.generation: int = index["generation"]
+        self.built_at: float = index["built_at"]
+        self.entries: Dict[str, Any] = index["entries"]
+        self._body_start = HEADER.size + index_length
+        self._view = memoryview(self._mmap)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.built_at
+
+    def get(self, key: str) -> Optional[memoryview]:
+        """Zero-copy slice of the mapped file"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        offset, length = entry
+        start = self._body_start + offset
+        return self._view[start:start + length]
+
+
+class CatalogSnapshotStore:
+    def __init__(self, directory: str, check_interval: float = 1.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        os.makedirs(directory, exist_ok=True)
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._pointer_stat: Optional[tuple] = None
+        self._checked_at = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional["CatalogSnapshotStore"]:
+        """Store under CATALOG_SNAPSHOT_DIR, or None when disabled or unsupported"""
+        directory = os.getenv("CATALOG_SNAPSHOT_DIR", os.path.join("/tmp", "bizpromptai-catalog"))
+        if not directory or fcntl is None:
+            return None
+        try:
+            return cls(directory, float(os.getenv("CATALOG_SNAPSHOT_CHECK_INTERVAL", "1")))
+        except OSError as e:
+            logger.warning(f"Catalog snapshots disabled, {directory} unusable: {str(e)}")
+            return None
+
+    def current(self, force: bool = False) -> Optional[CatalogSnapshot]:
+        """Live generation; the pointer file is re-checked at most every check_interval"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return self._snapshot
+        self._checked_at = now
+
+        pointer = os.path.join(self.directory, POINTER)
+        try:
+            stat = os.stat(pointer)
+        except FileNotFoundError:
+            return self._snapshot
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._pointer_stat and self._snapshot is not None:
+            return self._snapshot
+
+        try:
+            with open(pointer) as f:
+                name = f.read().strip()
+            if self._snapshot is None or os.path.basename(self._snapshot.path) != name:
+                # The previous mapping is released once in-flight responses drop their slices
+                self._snapshot = CatalogSnapshot(os.path.join(self.directory, name))
+            self._pointer_stat = signature
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to map catalog snapshot: {str(e)}")
+        return self._snapshot
+
+    @contextmanager
+    def build_lock(self) -> Iterator[bool]:
+        """Non-blocking cross-process lock; yields False if another worker is building"""
+        with open(os.path.join(self.directory, LOCK), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def publish(self, bodies: Dict[str, bytes]) -> CatalogSnapshot:
+        """Write a new generation and swap the pointer to it (call while holding build_lock)"""
+        previous = self.current(force=True)
+        generation = (previous.generation if previous else 0) + 1
+
+        entries: Dict[str, Any] = {}
+        offset = 0
+        for key, body in bodies.items():
+            entries[key] = [offset, len(body)]
+            offset += len(body)
+        index = json.dumps({"generation": generation, "built_at": time.time(), "entries": entries}).encode("utf-8")
+
+        name = f"catalog-{generation:08d}-{os.getpid()}.bin"
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(index)))
+            f.write(index)
+            for body in bodies.values():
+                f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+        pointer = os.path.join(self.directory, POINTER)
+        with open(pointer + ".tmp", "w") as f:
+            f.write(name)
+        os.replace(pointer + ".tmp", pointer)
+
+        self._remove_old_generations(keep={name, os.path.basename(previous.path) if previous else name})
+        return self.current(force=True)
+
+    def _remove_old_generations(self, keep: set) -> None:
+        # Unlinking a mapped file is safe on POSIX; workers still holding it keep their mapping
+        for entry in os.listdir(self.directory):
+            if entry.startswith("catalog-") and entry not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except OSError:
+                    pass
+
+
+class BufferResponse(Response):
+    """Response whose body may be a memoryview, sent without copying"""
+
+    def render(self, content: Union[bytes, memoryview, None]) -> Union[bytes, memoryview]:
+        if isinstance(content, memoryview):
+            return content
+        return super().render(content)
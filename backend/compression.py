@@ -0,0 +1,198 @@
+"""Response compression: on-the-fly for dynamic responses, precompressed for cacheable ones
+
+CompressionMiddleware gzip/brotli-encodes compressible responses of at least
+COMPRESSION_MIN_SIZE bytes (streamed responses chunk by chunk) at a cheap level.
+Responses that are served many times, such as the prompt catalog, are instead
+compressed once at the highest level with precompress() and sent with their
+Content-Encoding already set, which the middleware leaves alone.
+
+Brotli is used when the brotli package is installed; gzip otherwise.
+"""
+import os
+import gzip
+import zlib
+import asyncio
+import hashlib
+from typing import Dict, List, Optional, Tuple, Union
+from starlette.datastructures import MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+IDENTITY = "identity"
+GZIP = "gzip"
+BROTLI = "br"
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript",
+    "application/xml", "image/svg+xml"
+)
+# Event streams must reach the client event by event
+EXCLUDED_TYPES = ("text/event-stream",)
+
+# Bodies above this are compressed off the event loop
+THREAD_THRESHOLD = 256 * 1024
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Supported content codings, most preferred first"""
+    return (BROTLI, GZIP) if brotli is not None else (GZIP,)
+
+
+def accepted_encodings(accept_encoding: Optional[str], available: Optional[Tuple[str, ...]] = None) -> List[str]:
+    """Codings from `available` the client accepts, best first, always ending with identity"""
+    available = available or available_encodings()
+    weights: Dict[str, float] = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    ranked = [
+        (weights.get(encoding, wildcard), -index, encoding)
+        for index, encoding in enumerate(available)
+        if weights.get(encoding, wildcard) > 0
+    ]
+    return [encoding for _, _, encoding in sorted(ranked, reverse=True)] + [IDENTITY]
+
+
+def compress(body: Union[bytes, memoryview], encoding: str, best: bool = False) -> bytes:
+    if encoding == BROTLI:
+        return brotli.compress(bytes(body), quality=11 if best else int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")))
+    # mtime=0 keeps output (and so caches and ETags) stable across rebuilds
+    return gzip.compress(body, compresslevel=9 if best else int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")), mtime=0)
+
+
+def precompress(body: bytes, min_size: Optional[int] = None) -> Dict[str, bytes]:
+    """Every supported coding of a body at maximum compression; empty if it's too small to bother"""
+    min_size = min_size if min_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    if len(body) < min_size:
+        return {}
+    return {encoding: compress(body, encoding, best=True) for encoding in available_encodings()}
+
+
+def weak_etag(body: Union[bytes, memoryview]) -> str:
+    """Validator shared by every coding of the same content"""
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (candidate.strip()[2:] if candidate.strip().startswith("W/") else candidate.strip()) == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+class StreamCompressor:
+    """Incremental encoder that flushes after every chunk so streamed output isn't held back"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == BROTLI:
+            self._compressor = brotli.Compressor(quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")))
+        else:
+            self._compressor = zlib.compressobj(int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")), zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == BROTLI:
+            return self._compressor.process(bytes(chunk)) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == BROTLI:
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def add_vary(headers: MutableHeaders, value: str) -> None:
+    existing = [item.strip().lower() for item in headers.get("vary", "").split(",") if item.strip()]
+    if "*" not in existing and value.lower() not in existing:
+        headers["vary"] = ", ".join(filter(None, [headers.get("vary"), value]))
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware that compresses eligible responses for clients that accept it"""
+
+    def __init__(self, app, min_size: Optional[int] = None):
+        self.app = app
+        self.min_size = min_size if min_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+        self.enabled = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+        encoding = accepted_encodings(accept)[0]
+
+        state: Dict[str, object] = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_compressed(message) -> None:
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows whether compression applies
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                state["start"] = None
+                headers = MutableHeaders(scope=start)
+                content_type = headers.get("content-type", "").lower()
+                compressible = content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(EXCLUDED_TYPES)
+                if compressible:
+                    add_vary(headers, "Accept-Encoding")
+
+                if (
+                    not compressible
+                    or encoding == IDENTITY
+                    or "content-encoding" in headers
+                    or "no-transform" in headers.get("cache-control", "")
+                    or start["status"] < 200 or start["status"] in (204, 304)
+                    or (not more_body and len(body) < self.min_size)
+                ):
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["content-encoding"] = encoding
+                if not more_body:
+                    compressed = await asyncio.to_thread(compress, body, encoding) if len(body) > THREAD_THRESHOLD else compress(body, encoding)
+                    headers["content-length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+                del headers["content-length"]
+                state["compressor"] = StreamCompressor(encoding)
+                await send(start)
+
+            compressor: StreamCompressor = state["compressor"]
+            chunk = compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
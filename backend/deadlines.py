@@ -0,0 +1,152 @@
+"""Per-request deadline budgets for Mongo queries and outbound calls
+
+DeadlineMiddleware gives every request a budget (REQUEST_DEADLINE_SECONDS). Motor
+queries inherit it through pymongo's client-side operation timeout, and outbound
+calls take min(per-call timeout, time left) via call_budget()/with_deadline().
+Requests that fail once their budget is spent are answered with 504, and every
+timeout is counted per operation for /api/admin/metrics.
+"""
+import os
+import json
+import time
+import asyncio
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Optional
+import pymongo
+from pymongo import monitoring
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Paths whose responses legitimately outlive a request budget (streams, bulk transfers)
+DEFAULT_EXEMPT_PATHS = "/api/admin/dashboard/stream,/api/admin/export/,/api/admin/leads/import"
+
+# Server-side MaxTimeMSExpired
+MAX_TIME_EXPIRED = 50
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+_exceeded: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_deadline_exceeded", default=None)
+
+timeouts: Counter = Counter()
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, operation: str):
+        self.operation = operation
+        super().__init__(f"Deadline exceeded during {operation}")
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def record_timeout(operation: str) -> None:
+    timeouts[operation] += 1
+    state = _exceeded.get()
+    if state is not None:
+        state["operation"] = operation
+    logger.warning(f"Timeout during {operation}")
+
+
+def call_budget(operation: str, per_call: float) -> float:
+    """Timeout for one outbound call: its own limit, capped by what's left of the request"""
+    left = remaining()
+    if left is None:
+        return per_call
+    if left <= 0:
+        record_timeout(operation)
+        raise DeadlineExceeded(operation)
+    return min(per_call, left)
+
+
+async def with_deadline(awaitable: Awaitable[Any], operation: str, per_call: float) -> Any:
+    try:
+        return await asyncio.wait_for(awaitable, timeout=call_budget(operation, per_call))
+    except asyncio.TimeoutError:
+        record_timeout(operation)
+        raise DeadlineExceeded(operation)
+
+
+def metrics() -> Dict[str, int]:
+    return dict(timeouts)
+
+
+class MongoTimeoutListener(monitoring.CommandListener):
+    """Counts Mongo commands that failed on a time limit"""
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        pass
+
+    def failed(self, event) -> None:
+        failure = event.failure or {}
+        if failure.get("code") == MAX_TIME_EXPIRED or "timed out" in str(failure.get("errmsg", "")).lower():
+            record_timeout("mongo")
+
+
+async def send_timeout_response(send, operation: str) -> None:
+    body = json.dumps({"detail": f"Deadline exceeded during {operation}"}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 504,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware that scopes a deadline to each HTTP request"""
+
+    def __init__(self, app, seconds: Optional[float] = None, exempt_paths: Optional[str] = None):
+        self.app = app
+        self.seconds = seconds if seconds is not None else float(os.getenv("REQUEST_DEADLINE_SECONDS", "15"))
+        paths = exempt_paths if exempt_paths is not None else os.getenv("DEADLINE_EXEMPT_PATHS", DEFAULT_EXEMPT_PATHS)
+        self.exempt_paths = tuple(path.strip() for path in paths.split(",") if path.strip())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.seconds <= 0 or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.seconds
+        # Clients may ask for a tighter budget, never a looser one
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-timeout":
+                try:
+                    budget = min(budget, max(float(value), 0.001))
+                except ValueError:
+                    pass
+
+        state: Dict[str, Any] = {"operation": None, "replaced": False, "started": False}
+        deadline_token = _deadline.set(time.monotonic() + budget)
+        exceeded_token = _exceeded.set(state)
+
+        async def send_with_deadline(message) -> None:
+            if message["type"] == "http.response.start":
+                state["started"] = True
+                spent = remaining() is not None and remaining() <= 0
+                if message["status"] >= 500 and (state["operation"] or spent):
+                    if not state["operation"]:
+                        record_timeout("request")
+                    state["replaced"] = True
+                    await send_timeout_response(send, state["operation"] or "request")
+                    return
+            if not state["replaced"]:
+                await send(message)
+
+        try:
+            with pymongo.timeout(budget):
+                await self.app(scope, receive, send_with_deadline)
+        except DeadlineExceeded as e:
+            if not state["started"]:
+                await send_timeout_response(send, e.operation)
+        finally:
+            _exceeded.reset(exceeded_token)
+            _deadline.reset(deadline_token)
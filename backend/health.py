@@ -0,0 +1,128 @@
+"""Cached dependency health for liveness and readiness probes
+
+A background loop per dependency runs its check on an interval and stores the
+outcome. The probe endpoints only read those results, so load balancer and
+orchestrator probe traffic never reaches Mongo or the upstream APIs. Readiness
+fails when a critical dependency is down, its last result is stale, or the
+worker is draining for shutdown.
+"""
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+UP = "up"
+DOWN = "down"
+UNCONFIGURED = "unconfigured"
+PENDING = "pending"
+
+
+class HealthMonitor:
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        critical: Optional[str] = None
+    ):
+        self.interval = interval if interval is not None else float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("HEALTH_CHECK_TIMEOUT", "3"))
+        names = critical if critical is not None else os.getenv("HEALTH_CRITICAL_CHECKS", "mongo")
+        self.critical = {name.strip() for name in names.split(",") if name.strip()}
+        self.started_at = time.monotonic()
+        self.draining = False
+        self.checks: Dict[str, Tuple[Callable[[], Awaitable[Any]], float]] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def register(
+        self,
+        name: str,
+        check: Callable[[], Awaitable[Any]],
+        interval: Optional[float] = None,
+        enabled: bool = True
+    ) -> None:
+        """Add a dependency check; disabled checks are reported as unconfigured and never run"""
+        if not enabled:
+            self.results[name] = {"status": UNCONFIGURED}
+            return
+        self.checks[name] = (check, interval or self.interval)
+        self.results[name] = {"status": PENDING}
+
+    async def run_check(self, name: str) -> Dict[str, Any]:
+        check, _ = self.checks[name]
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=self.timeout)
+            result = {"status": UP}
+        except asyncio.TimeoutError:
+            result = {"status": DOWN, "error": f"timed out after {self.timeout:g}s"}
+        except Exception as e:
+            result = {"status": DOWN, "error": str(e)[:200]}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["checked_at"] = datetime.now(timezone.utc).isoformat()
+        result["_checked"] = time.monotonic()
+
+        previous = self.results.get(name, {}).get("status")
+        if previous in (UP, DOWN) and previous != result["status"]:
+            log = logger.info if result["status"] == UP else logger.warning
+            log(f"Health check {name} changed {previous} -> {result['status']}")
+        self.results[name] = result
+        return result
+
+    async def _check_loop(self, name: str) -> None:
+        _, interval = self.checks[name]
+        while True:
+            await self.run_check(name)
+            await asyncio.sleep(interval)
+
+    def start(self) -> None:
+        for name in self.checks:
+            self._tasks.append(asyncio.create_task(self._check_loop(name)))
+
+    def begin_drain(self) -> None:
+        """Fail readiness from now on so load balancers stop routing here"""
+        if not self.draining:
+            self.draining = True
+            logger.info("Readiness failing: worker is draining")
+
+    async def stop(self) -> None:
+        self.begin_drain()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Latest result per dependency, with how old it is"""
+        now = time.monotonic()
+        services = {}
+        for name, result in self.results.items():
+            entry = {key: value for key, value in result.items() if not key.startswith("_")}
+            if "_checked" in result:
+                entry["age_seconds"] = round(now - result["_checked"], 1)
+                if name in self.checks and now - result["_checked"] > 3 * self.checks[name][1] + self.timeout:
+                    entry["stale"] = True
+            entry["critical"] = name in self.critical
+            services[name] = entry
+        return services
+
+    def liveness(self) -> Dict[str, Any]:
+        return {"status": "alive", "pid": os.getpid(), "uptime_seconds": round(time.monotonic() - self.started_at, 1)}
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        services = self.snapshot()
+        failing = [
+            name for name, entry in services.items()
+            if name in self.critical and (entry["status"] != UP or entry.get("stale"))
+        ]
+        ready = not failing and not self.draining
+        body: Dict[str, Any] = {"status": "ready" if ready else "not ready", "services": services}
+        if self.draining:
+            body["reason"] = "draining"
+        elif failing:
+            body["reason"] = f"critical dependencies unavailable: {', '.join(sorted(failing))}"
+        return ready, body
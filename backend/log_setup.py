@@ -0,0 +1,207 @@
+"""Queued, structured logging
+
+Log calls only enqueue a record; a QueueListener thread formats and writes it, so
+stderr never blocks the event loop. Records carry the request's trace id and are
+written as JSON (LOG_FORMAT=json) or text. INFO-and-below lines from a call site
+that fires more than LOG_SAMPLE_BURST times per LOG_SAMPLE_WINDOW seconds are
+sampled 1 in LOG_SAMPLE_EVERY, with the number skipped attached to the next line.
+"""
+import os
+import sys
+import json
+import copy
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+from tracing import tracer
+
+# LogRecord attributes that aren't user-supplied extras
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "suppressed", "color_message"}
+
+# uvicorn.access args: (client_addr, method, path, http_version, status_code)
+ACCESS_FIELDS = ("client", "method", "path", "http_version", "status")
+
+_listener: Optional[QueueListener] = None
+_handler: Optional["NonBlockingQueueHandler"] = None
+_lock = threading.Lock()
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp each record with the current request's trace id (runs on the caller, before queueing)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = tracer.current_span()
+        record.request_id = span.trace_id if span is not None else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Per call site: let a burst through each window, then keep 1 in `every`"""
+
+    def __init__(self, burst: int, window: float, every: int, exempt: Tuple[str, ...] = ()):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.every = max(every, 1)
+        self.exempt = exempt
+        self._sites: Dict[Tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or self.burst <= 0 or record.name.startswith(self.exempt):
+            return True
+
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        site = self._sites.get(key)
+        if site is None or now - site[0] > self.window:
+            # [window start, seen in window, suppressed since last emitted]
+            site = [now, 0, site[2] if site else 0]
+            self._sites[key] = site
+        site[1] += 1
+
+        if site[1] <= self.burst or site[1] % self.every == 0:
+            if site[2]:
+                record.suppressed = site[2]
+                site[2] = 0
+            return True
+        site[2] += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now; the record is formatted on another thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "suppressed", None):
+            entry["suppressed"] = record.suppressed
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if getattr(record, "request_id", None):
+            line = f"{line} [request_id={record.request_id}]"
+        if getattr(record, "suppressed", None):
+            line = f"{line} [+{record.suppressed} similar]"
+        return line
+
+
+class AccessLogFilter(logging.Filter):
+    """Lift uvicorn access-log args into structured fields"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.args, tuple) and len(record.args) == len(ACCESS_FIELDS):
+            for field, value in zip(ACCESS_FIELDS, record.args):
+                setattr(record, field, value)
+        return True
+
+
+def configure_logging(level: Optional[str] = None) -> QueueListener:
+    """Route all logging through one queue and background writer (idempotent)"""
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(JsonFormatter() if os.getenv("LOG_FORMAT", "json").lower() == "json" else TextFormatter())
+
+        handler = NonBlockingQueueHandler(log_queue)
+        handler.addFilter(RequestContextFilter())
+        handler.addFilter(SamplingFilter(
+            burst=int(os.getenv("LOG_SAMPLE_BURST", "20")),
+            window=float(os.getenv("LOG_SAMPLE_WINDOW", "60")),
+            every=int(os.getenv("LOG_SAMPLE_EVERY", "100")),
+            exempt=tuple(name.strip() for name in os.getenv("LOG_SAMPLE_EXEMPT", "uvicorn.access").split(",") if name.strip())
+        ))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        _handler = handler
+        root.setLevel((level or os.getenv("LOG_LEVEL", "info")).upper())
+
+        # uvicorn installs its own synchronous stderr handlers; send its records through the queue too
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers = []
+            uvicorn_logger.propagate = True
+        logging.getLogger("uvicorn.access").addFilter(AccessLogFilter())
+
+        _listener = QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(flush_logging)
+        if hasattr(os, "register_at_fork"):
+            # A forked worker inherits the handler but not the writer thread
+            os.register_at_fork(after_in_child=_restart_listener)
+        return _listener
+
+
+def flush_logging() -> None:
+    """Write out queued records and stop the writer thread"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def stats() -> Dict[str, int]:
+    if _handler is None:
+        return {}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
+
+
+def _restart_listener() -> None:
+    # The inherited queue holds the parent's unwritten records (and possibly a lock held by
+    # its writer thread), so the child starts over with a fresh queue
+    if _listener is not None and _handler is not None:
+        _handler.queue = queue.Queue(maxsize=_handler.queue.maxsize)
+        _listener.queue = _handler.queue
+        _listener._thread = None
+        _listener.start()
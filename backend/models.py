@@ -25,8 +25,14 @@ class LeadMagnetSignup(BaseModel):
     name: Optional[str] = None
     magnet_type: Optional[str] = None
     source_page: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow)  # first seen
+    last_seen_at: Optional[datetime] = None
+    submission_count: int = 1
     convertkit_subscriber_id: Optional[str] = None
+    convertkit_status: Optional[str] = None
+    convertkit_enrolled_at: Optional[datetime] = None
+    engagement_score: Optional[float] = None
+    high_engagement_status: Optional[str] = None
     
     class Config:
         json_encoders = {
@@ -66,6 +72,7 @@ class Prompt(BaseModel):
     category: str
     tags: List[str] = Field(default_factory=list)
     is_premium: bool = False
+    version: int = 1
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     class Config:
@@ -85,6 +92,15 @@ class PaymentCheckoutRequest(BaseModel):
     success_url: str
     cancel_url: str
 
+class PromptRenderRequest(BaseModel):
+    variables: Dict[str, str] = Field(default_factory=dict)
+
+class PromptBatchRenderRequest(BaseModel):
+    variable_sets: List[Dict[str, str]]
+
+class PaymentStatusBatchRequest(BaseModel):
+    session_ids: List[str]
+
 class PaymentStatusResponse(BaseModel):
     session_id: str
     payment_status: str
@@ -0,0 +1,177 @@
+"""Motor connection pool settings, staleness-tolerant read routing and pool metrics
+
+Pool size, wait-queue timeout and wire compression come from MONGO_* settings.
+Read-heavy queries that tolerate slightly old data use stale_reads(), which
+routes them to secondaries lagging no more than MONGO_MAX_STALENESS_SECONDS and
+falls back to the primary when none qualify. PoolMonitor times every connection
+checkout so pool exhaustion shows up in /api/admin/metrics before it shows up as
+timeouts.
+"""
+import os
+import time
+import threading
+from typing import Any, Dict, List
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import monitoring
+from pymongo.read_preferences import SecondaryPreferred
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The server rejects maxStalenessSeconds below 90
+MIN_MAX_STALENESS = 90
+
+# Checkout wait histogram bucket upper bounds, in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+def _available_compressors(names: str) -> List[str]:
+    """Requested compressors whose libraries are installed, in preference order"""
+    available = []
+    for name in (name.strip() for name in names.split(",")):
+        if not name:
+            continue
+        module = COMPRESSOR_MODULES.get(name)
+        if module is None:
+            logger.warning(f"Unknown Mongo compressor {name}, ignoring")
+            continue
+        try:
+            __import__(module)
+            available.append(name)
+        except ImportError:
+            logger.warning(f"Mongo compressor {name} requested but {module} is not installed")
+    return available
+
+
+def client_options() -> Dict[str, Any]:
+    """Keyword arguments for AsyncIOMotorClient from the environment"""
+    options: Dict[str, Any] = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxConnecting": int(os.getenv("MONGO_MAX_CONNECTING", "2")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "0")) or None,
+        # How long a query waits for a free connection before failing (0 waits indefinitely)
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")) or None
+    }
+    compressors = _available_compressors(os.getenv("MONGO_COMPRESSORS", ""))
+    if compressors:
+        options["compressors"] = compressors
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = int(os.getenv("MONGO_ZLIB_LEVEL", "6"))
+    return options
+
+
+def max_staleness() -> int:
+    """Upper bound, in seconds, on how far behind a stale_reads() query may be"""
+    return max(int(os.getenv("MONGO_MAX_STALENESS_SECONDS", "90")), MIN_MAX_STALENESS)
+
+
+def stale_reads(database: AsyncIOMotorDatabase) -> AsyncIOMotorDatabase:
+    """Same database, reading from a sufficiently fresh secondary when one is available"""
+    if os.getenv("MONGO_STALE_READS", "true").lower() != "true":
+        return database
+    return database.with_options(read_preference=SecondaryPreferred(max_staleness=max_staleness()))
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Checkout wait times and pool gauges per server address"""
+
+    def __init__(self):
+        # Checkout start and finish fire on the same executor thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.pools: Dict[str, Dict[str, Any]] = {}
+
+    def _pool(self, address) -> Dict[str, Any]:
+        key = f"{address[0]}:{address[1]}"
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {
+                "open": 0,
+                "checked_out": 0,
+                "checkouts": 0,
+                "checkout_failures": {},
+                "wait_ms_total": 0.0,
+                "wait_ms_max": 0.0,
+                "wait_ms_buckets": [0] * (len(WAIT_BUCKETS_MS) + 1),
+                "cleared": 0
+            }
+        return pool
+
+    def _waited_ms(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event) -> None:
+        waited = self._waited_ms()
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checked_out"] += 1
+            pool["checkouts"] += 1
+            pool["wait_ms_total"] += waited
+            pool["wait_ms_max"] = max(pool["wait_ms_max"], waited)
+            bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if waited <= bound), len(WAIT_BUCKETS_MS))
+            pool["wait_ms_buckets"][bucket] += 1
+
+    def connection_check_out_failed(self, event) -> None:
+        waited = self._waited_ms()
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checkout_failures"][event.reason] = pool["checkout_failures"].get(event.reason, 0) + 1
+            pool["wait_ms_max"] = max(pool["wait_ms_max"], waited)
+
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checked_out"] = max(pool["checked_out"] - 1, 0)
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self._pool(event.address)["open"] += 1
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open"] = max(pool["open"] - 1, 0)
+
+    def pool_cleared(self, event) -> None:
+        with self._lock:
+            self._pool(event.address)["cleared"] += 1
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for address, pool in self.pools.items():
+                checkouts = pool["checkouts"]
+                result[address] = {
+                    "open": pool["open"],
+                    "checked_out": pool["checked_out"],
+                    "checkouts": checkouts,
+                    "checkout_failures": dict(pool["checkout_failures"]),
+                    "cleared": pool["cleared"],
+                    "wait_ms_avg": round(pool["wait_ms_total"] / checkouts, 3) if checkouts else 0.0,
+                    "wait_ms_max": round(pool["wait_ms_max"], 3),
+                    "wait_ms_buckets": dict(zip([f"le_{bound}" for bound in WAIT_BUCKETS_MS] + ["inf"], pool["wait_ms_buckets"]))
+                }
+            return result
+
+
+pool_monitor = PoolMonitor()
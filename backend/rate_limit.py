@@ -0,0 +1,172 @@
+import os
+import math
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple, Deque
+from fastapi import HTTPException, Request
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitBackend:
+    """Storage for sliding-window hit counts; returns (allowed, retry_after_seconds)"""
+
+    async def hit(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        raise NotImplementedError
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Exact sliding-window log, local to one worker process"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # Least recently hit first, so eviction only ever looks at the oldest end
+        self._hits: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        # Each key's own window; rules with different windows share the key space
+        self._windows: Dict[str, float] = {}
+
+    async def hit(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        hits = self._hits.get(key)
+        if hits is None:
+            self._evict(now)
+            hits = self._hits[key] = deque()
+            self._windows[key] = window
+        else:
+            self._hits.move_to_end(key)
+
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+
+        if len(hits) >= limit:
+            return False, hits[0] + window - now
+
+        hits.append(now)
+        return True, 0.0
+
+    def _evict(self, now: float) -> None:
+        """Drop expired keys from the oldest end, then the oldest live ones if still at the cap"""
+        while self._hits:
+            key, hits = next(iter(self._hits.items()))
+            expired = not hits or hits[-1] <= now - self._windows[key]
+            if not expired and len(self._hits) < self.max_keys:
+                break
+            del self._hits[key]
+            del self._windows[key]
+
+
+class MongoRateLimitBackend(RateLimitBackend):
+    """Sliding-window counter shared by all workers through a TTL'd Mongo collection"""
+
+    def __init__(self, database: AsyncIOMotorDatabase, collection: str = "rate_limits"):
+        self.collection = database[collection]
+        self._indexed = False
+
+    async def hit(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        if not self._indexed:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+
+        now = time.time()
+        bucket = int(now // window)
+        elapsed = now - bucket * window
+
+        previous = await self.collection.find_one({"_id": f"{key}:{bucket - 1}"})
+        # Weight the previous fixed window by how much of it still overlaps the sliding window
+        previous_count = previous["count"] if previous else 0
+        allowed_before = limit - 1 - previous_count * (1 - elapsed / window)
+        if allowed_before < 0:
+            return False, window - elapsed
+
+        # Only allowed hits are counted, so a client retrying while limited isn't locked out for longer
+        below_limit = {"_id": f"{key}:{bucket}", "count": {"$lte": allowed_before}}
+        try:
+            await self.collection.update_one(
+                below_limit,
+                {
+                    "$inc": {"count": 1},
+                    "$setOnInsert": {"expires_at": datetime.fromtimestamp((bucket + 2) * window, tz=timezone.utc)}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The bucket exists: either it is full or another worker created it concurrently
+            result = await self.collection.update_one(below_limit, {"$inc": {"count": 1}})
+            if not result.matched_count:
+                return False, window - elapsed
+        return True, 0.0
+
+
+class RateLimiter:
+    def __init__(self, backend: Optional[RateLimitBackend] = None):
+        self.backend = backend or InMemoryRateLimitBackend()
+        self.enabled = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+        self.trust_proxy = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+
+        # "<requests>/<seconds>" per client IP and per email address
+        self.rules = {
+            "login": {
+                "ip": self._parse_rule(os.getenv("RATE_LIMIT_LOGIN_IP", "20/60")),
+                "email": self._parse_rule(os.getenv("RATE_LIMIT_LOGIN_EMAIL", "5/60"))
+            },
+            "register": {
+                "ip": self._parse_rule(os.getenv("RATE_LIMIT_REGISTER_IP", "10/3600")),
+                "email": self._parse_rule(os.getenv("RATE_LIMIT_REGISTER_EMAIL", "3/3600"))
+            },
+            "lead_magnet": {
+                "ip": self._parse_rule(os.getenv("RATE_LIMIT_LEAD_MAGNET_IP", "30/60")),
+                "email": self._parse_rule(os.getenv("RATE_LIMIT_LEAD_MAGNET_EMAIL", "3/600"))
+            }
+        }
+
+    @staticmethod
+    def _parse_rule(value: str) -> Tuple[int, float]:
+        limit, _, window = value.partition("/")
+        return int(limit), float(window or 60)
+
+    def client_ip(self, request: Request) -> str:
+        if self.trust_proxy:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def enforce(self, rule_name: str, request: Request, email: Optional[str] = None) -> None:
+        """Raise 429 with Retry-After if the client or email exceeded the named rule"""
+        if not self.enabled:
+            return
+
+        rule = self.rules[rule_name]
+        checks = [("ip", self.client_ip(request))]
+        # The body isn't validated yet; a non-string email is left for the handler to reject
+        if isinstance(email, str) and email.strip():
+            checks.append(("email", email.strip().lower()))
+
+        for scope, identity in checks:
+            limit, window = rule[scope]
+            try:
+                allowed, retry_after = await self.backend.hit(f"{rule_name}:{scope}:{identity}", limit, window)
+            except Exception as e:
+                # Fail open: a broken shared backend must not take logins down with it
+                logger.error(f"Rate limit backend failed: {str(e)}")
+                return
+
+            if not allowed:
+                logger.warning(f"Rate limit exceeded for {rule_name} by {scope} {identity}")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests, please try again later",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                )
+
+
+def create_rate_limiter(database: AsyncIOMotorDatabase) -> RateLimiter:
+    """Build the limiter for the configured RATE_LIMIT_BACKEND (memory or mongo)"""
+    backend_name = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    if backend_name == "mongo":
+        return RateLimiter(MongoRateLimitBackend(database))
+    return RateLimiter(InMemoryRateLimitBackend())
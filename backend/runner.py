@@ -0,0 +1,292 @@
+"""Production entry point: pre-forked uvicorn workers under a restarting supervisor
+
+    python runner.py --workers 4
+    python runner.py --reload          # development, single process with file watcher
+
+SIGTERM/SIGINT drain every worker (stop accepting, finish in-flight requests and
+background jobs, run lifespan shutdown) before exiting; SIGHUP replaces workers
+one at a time.
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import logging
+import multiprocessing
+from collections import deque
+from typing import List, Optional
+import uvicorn
+from dotenv import load_dotenv
+from log_setup import configure_logging, flush_logging
+from background import task_supervisor
+
+load_dotenv()
+
+logger = logging.getLogger("runner")
+
+APP = "server:app"
+
+# Worker exit code when the app fails to start (lifespan error, bad import)
+STARTUP_FAILED = 3
+
+# Restarting more often than this within CRASH_WINDOW seconds backs off
+CRASH_LIMIT = 5
+CRASH_WINDOW = 60.0
+MAX_BACKOFF = 30.0
+
+
+def resolve_loop(choice: str) -> str:
+    if choice != "auto":
+        return choice
+    try:
+        import uvloop  # noqa: F401
+        return "uvloop"
+    except ImportError:
+        return "asyncio"
+
+
+def resolve_http(choice: str) -> str:
+    if choice != "auto":
+        return choice
+    try:
+        import httptools  # noqa: F401
+        return "httptools"
+    except ImportError:
+        return "h11"
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the BizPromptAI backend")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--loop", choices=["auto", "uvloop", "asyncio"], default=os.getenv("UVICORN_LOOP", "auto"))
+    parser.add_argument("--http", choices=["auto", "httptools", "h11"], default=os.getenv("UVICORN_HTTP", "auto"))
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("GRACEFUL_TIMEOUT", "30")),
+                        help="Seconds a worker may spend draining in-flight requests on shutdown")
+    parser.add_argument("--startup-timeout", type=float, default=float(os.getenv("STARTUP_TIMEOUT", "60")),
+                        help="Seconds a replacement worker gets to finish startup during a reload")
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("KEEP_ALIVE_TIMEOUT", "5")))
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("SOCKET_BACKLOG", "2048")))
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS", "0")),
+                        help="Recycle a worker after this many requests (0 disables)")
+    parser.add_argument("--forwarded-allow-ips", default=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"))
+    parser.add_argument("--preload", action="store_true", default=os.getenv("PRELOAD_APP", "false").lower() == "true",
+                        help="Import the app once in the supervisor so workers share its memory")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument("--reload", action="store_true", help="Development mode: one process, restart on code changes")
+    return parser.parse_args(argv)
+
+
+def build_config(args: argparse.Namespace, worker: int = 0) -> uvicorn.Config:
+    max_requests = None
+    if args.max_requests:
+        # Stagger recycling so workers don't all restart at once
+        max_requests = args.max_requests + (worker * 37) % max(args.max_requests // 10, 1)
+    return uvicorn.Config(
+        APP,
+        host=args.host,
+        port=args.port,
+        loop=resolve_loop(args.loop),
+        http=resolve_http(args.http),
+        log_level=args.log_level,
+        # Logging is already routed through log_setup's queue; don't let uvicorn reinstall its handlers
+        log_config=None,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        limit_max_requests=max_requests,
+        backlog=args.backlog
+    )
+
+
+def bind_socket(args: argparse.Namespace) -> socket.socket:
+    family = socket.AF_INET6 if ":" in args.host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn server that tells the supervisor once lifespan startup has finished"""
+
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self.ready = ready
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=sockets)
+        if self.started:
+            self.ready.set()
+
+    def handle_exit(self, sig, frame) -> None:
+        # Background jobs stop starting now; lifespan shutdown waits for the running ones
+        task_supervisor.begin_drain()
+        super().handle_exit(sig, frame)
+
+
+def run_worker(config: uvicorn.Config, sock: socket.socket, ready) -> None:
+    # Only the supervisor reacts to SIGHUP; uvicorn installs its own SIGTERM/SIGINT handlers
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    server = WorkerServer(config, ready)
+    try:
+        server.run(sockets=[sock])
+    finally:
+        # multiprocessing exits workers with os._exit, which skips atexit
+        flush_logging()
+    if not server.started:
+        sys.exit(STARTUP_FAILED)
+
+
+class Supervisor:
+    """Keeps N forked workers alive on a shared listening socket"""
+
+    def __init__(self, args: argparse.Namespace, sock: socket.socket):
+        self.args = args
+        self.sock = sock
+        self.context = multiprocessing.get_context("fork")
+        self.workers: List[Optional[multiprocessing.Process]] = [None] * args.workers
+        self.started_at: List[float] = [0.0] * args.workers
+        self.crashes: deque = deque()
+        self.should_exit = False
+        self.reload_requested = False
+
+    def spawn(self, index: int):
+        config = build_config(self.args, index)
+        if self.args.preload:
+            config.load()
+        ready = self.context.Event()
+        process = self.context.Process(target=run_worker, args=(config, self.sock, ready), name=f"worker-{index}")
+        process.start()
+        self.workers[index] = process
+        self.started_at[index] = time.monotonic()
+        logger.info(f"Started worker {index} (pid {process.pid})")
+        return ready
+
+    def handle_exit(self, signum, frame) -> None:
+        self.should_exit = True
+
+    def handle_reload(self, signum, frame) -> None:
+        self.reload_requested = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, self.handle_exit)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+
+        logger.info(
+            f"Supervisor pid {os.getpid()} serving {APP} on {self.args.host}:{self.args.port} "
+            f"with {self.args.workers} workers (loop={resolve_loop(self.args.loop)}, http={resolve_http(self.args.http)})"
+        )
+        for index in range(self.args.workers):
+            self.spawn(index)
+
+        while not self.should_exit:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_restart()
+            for index, process in enumerate(self.workers):
+                if process is not None and not process.is_alive() and not self.should_exit:
+                    self.restart(index, process)
+            time.sleep(0.5)
+
+        self.shutdown()
+
+    def restart(self, index: int, process: multiprocessing.Process) -> None:
+        process.join()
+        uptime = time.monotonic() - self.started_at[index]
+        if process.exitcode == 0 and self.args.max_requests:
+            logger.info(f"Worker {index} (pid {process.pid}) recycled after max requests")
+        else:
+            logger.warning(f"Worker {index} (pid {process.pid}) exited with code {process.exitcode} after {uptime:.1f}s, restarting")
+            now = time.monotonic()
+            self.crashes.append(now)
+            while self.crashes and now - self.crashes[0] > CRASH_WINDOW:
+                self.crashes.popleft()
+            if len(self.crashes) > CRASH_LIMIT:
+                backoff = min(MAX_BACKOFF, 2 ** (len(self.crashes) - CRASH_LIMIT))
+                logger.error(f"Workers crashing repeatedly, waiting {backoff:.0f}s before restarting")
+                self.sleep(backoff)
+                if self.should_exit:
+                    return
+        self.spawn(index)
+
+    def rolling_restart(self) -> None:
+        """Replace workers one at a time so the socket always has live acceptors"""
+        logger.info("Reloading workers")
+        for index, old in enumerate(self.workers):
+            ready = self.spawn(index)
+            deadline = time.monotonic() + self.args.startup_timeout
+            while not ready.wait(0.5):
+                if self.should_exit or not self.workers[index].is_alive() or time.monotonic() > deadline:
+                    logger.error(f"Replacement worker {index} did not start, keeping the old one")
+                    self.workers[index].kill()
+                    self.workers[index] = old
+                    return
+            if old is not None and old.is_alive():
+                os.kill(old.pid, signal.SIGTERM)
+                old.join(self.args.graceful_timeout + 5)
+                if old.is_alive():
+                    old.kill()
+            if self.should_exit:
+                return
+
+    def shutdown(self) -> None:
+        logger.info(f"Draining workers (up to {self.args.graceful_timeout:.0f}s)")
+        alive = [process for process in self.workers if process is not None and process.is_alive()]
+        for process in alive:
+            os.kill(process.pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        for process in alive:
+            process.join(max(0.0, deadline - time.monotonic()))
+        for process in alive:
+            if process.is_alive():
+                logger.warning(f"Worker pid {process.pid} did not drain in time, killing")
+                process.kill()
+                process.join()
+
+        self.sock.close()
+        logger.info("Supervisor stopped")
+
+    def sleep(self, seconds: float) -> None:
+        deadline = time.monotonic() + seconds
+        while not self.should_exit and time.monotonic() < deadline:
+            time.sleep(min(0.5, deadline - time.monotonic()))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    configure_logging(args.log_level)
+
+    if args.reload or args.workers <= 1 or not hasattr(os, "fork"):
+        uvicorn.run(
+            APP,
+            host=args.host,
+            port=args.port,
+            reload=args.reload,
+            loop=resolve_loop(args.loop),
+            http=resolve_http(args.http),
+            log_level=args.log_level,
+            log_config=None,
+            proxy_headers=True,
+            forwarded_allow_ips=args.forwarded_allow_ips,
+            timeout_keep_alive=args.keep_alive,
+            timeout_graceful_shutdown=args.graceful_timeout
+        )
+        return
+
+    if os.getenv("RATE_LIMIT_BACKEND", "memory") == "memory":
+        logger.warning("RATE_LIMIT_BACKEND=memory keeps separate limits per worker; use mongo for shared limits")
+
+    Supervisor(args, bind_socket(args)).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""One-shot sample data seeding
+
+    python seed.py
+
+The API also seeds at startup (SEED_SAMPLE_DATA=true), but only the worker that
+wins the startup_tasks lease does the work, in the background.
+"""
+import os
+import asyncio
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict
+import bcrypt
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from dotenv import load_dotenv
+from models import User, Prompt
+import logging
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ADMIN_EMAIL = "admin@bizpromptai.com"
+
+SAMPLE_PROMPTS = [
+    Prompt(
+        title="Email Marketing Campaign Creator",
+        content="Create a comprehensive email marketing campaign for [PRODUCT/SERVICE] targeting [TARGET AUDIENCE]. Include subject lines, email sequences, and call-to-action strategies.",
+        category="Marketing",
+        tags=["email", "marketing", "campaigns"]
+    ),
+    Prompt(
+        title="Social Media Content Planner",
+        content="Generate a 30-day social media content calendar for [BUSINESS TYPE] focusing on [GOALS]. Include post ideas, hashtags, and engagement strategies.",
+        category="Social Media",
+        tags=["social media", "content", "planning"]
+    ),
+    Prompt(
+        title="Business Process Optimizer",
+        content="Analyze and optimize the [BUSINESS PROCESS] for [COMPANY]. Identify bottlenecks, suggest improvements, and create implementation timeline.",
+        category="Operations",
+        tags=["process", "optimization", "efficiency"]
+    )
+]
+
+
+async def seed_sample_data(database: AsyncIOMotorDatabase) -> Dict[str, int]:
+    """Create the admin user and sample prompts if they don't exist yet"""
+    created = {"users": 0, "prompts": 0}
+
+    if not await database.users.find_one({"email": ADMIN_EMAIL}, {"_id": 1}):
+        hashed_password = bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt())
+        admin = User(
+            email=ADMIN_EMAIL,
+            name="Admin User",
+            role="admin"
+        )
+        await database.users.insert_one({
+            **admin.dict(),
+            "password": hashed_password.decode('utf-8')
+        })
+        created["users"] = 1
+        logger.info("Created admin user")
+
+    if not await database.prompts.find_one({}, {"_id": 1}):
+        await database.prompts.insert_many([prompt.dict() for prompt in SAMPLE_PROMPTS], ordered=False)
+        created["prompts"] = len(SAMPLE_PROMPTS)
+        logger.info("Created sample prompts")
+
+    return created
+
+
+async def run_once(
+    database: AsyncIOMotorDatabase,
+    name: str,
+    task: Callable[[AsyncIOMotorDatabase], Awaitable[Dict[str, int]]],
+    lease_seconds: float = 60
+) -> bool:
+    """Run a task on exactly one worker: the first to take the lease runs it, the rest return False
+
+    A worker that dies mid-task leaves the lease to expire, so another worker can retry it.
+    """
+    now = datetime.utcnow()
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        await database.startup_tasks.update_one(
+            {"_id": name, "completed_at": None, "lease_until": {"$lt": now}},
+            {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=lease_seconds), "completed_at": None}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Already completed, or another worker holds the lease
+        return False
+
+    try:
+        result = await task(database)
+        await database.startup_tasks.update_one(
+            {"_id": name},
+            {"$set": {"completed_at": datetime.utcnow(), "result": result}}
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Startup task {name} failed: {str(e)}")
+        await database.startup_tasks.update_one({"_id": name}, {"$set": {"lease_until": datetime.utcnow()}})
+        return False
+
+
+async def main() -> None:
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    try:
+        created = await seed_sample_data(client.bizpromptai)
+        print(f"Seeded {created['users']} users and {created['prompts']} prompts")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
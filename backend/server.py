@@ -1,11 +1,14 @@
 import os
-import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Depends
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from contextlib import asynccontextmanager
 import asyncio
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
 from typing import Optional, Dict, Any
@@ -17,47 +20,147 @@ load_dotenv()
 
 # Import models and services
 from models import (
-    User, LeadMagnetSignup, PaymentTransaction, Prompt,
-    SubscribeRequest, PaymentCheckoutRequest, PaymentStatusResponse
+    User, PaymentTransaction,
+    SubscribeRequest, PaymentCheckoutRequest, PaymentStatusResponse, PaymentStatusBatchRequest,
+    PromptRenderRequest, PromptBatchRenderRequest
 )
 from services.stripe_service import StripePaymentService
 from services.convertkit_service import ConvertKitService
+from services.lead_service import LeadCaptureService
+from services.export_service import ExportService
+from services.analytics_service import AnalyticsService, GRANULARITIES
+from services.dashboard_feed import DashboardFeed, format_sse
+from services.prompt_render_service import PromptRenderService, TemplateVariablesError
+from services.entitlement_service import EntitlementService
+from services.similarity_service import SimilarityService, IndexUnavailableError
+from services.engagement_service import EngagementScoringService
+from services.retention_service import RetentionService
+from services.catalog_import_service import CatalogImportService, parse_catalog
+from streaming import iter_csv_records, iter_ndjson_records, encode_csv, encode_ndjson
+from tracing import tracer, MongoCommandTracer, TracingMiddleware
+from rate_limit import RateLimiter, create_rate_limiter
+from catalog_snapshot import BufferResponse
+from compression import CompressionMiddleware, accepted_encodings, etag_matches, IDENTITY
+from deadlines import DeadlineMiddleware, MongoTimeoutListener
+import deadlines
+from seed import seed_sample_data, run_once
+from log_setup import configure_logging
+from health import HealthMonitor
+from background import task_supervisor
+from mongo_pool import client_options, stale_reads, pool_monitor
+import log_setup
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Database connection
 client: AsyncIOMotorClient = None
 database: AsyncIOMotorDatabase = None
+# Secondary-preferred view for reads that tolerate MONGO_MAX_STALENESS_SECONDS of lag
+stale_database: AsyncIOMotorDatabase = None
 
 # Services
 stripe_service: StripePaymentService = None
 convertkit_service: ConvertKitService = None
+lead_service: LeadCaptureService = None
+export_service: ExportService = None
+analytics_service: AnalyticsService = None
+dashboard_feed: DashboardFeed = None
+prompt_render_service: PromptRenderService = None
+entitlement_service: EntitlementService = None
+similarity_service: SimilarityService = None
+engagement_service: EngagementScoringService = None
+retention_service: RetentionService = None
+catalog_import_service: CatalogImportService = None
+rate_limiter: RateLimiter = None
+health_monitor: HealthMonitor = None
+
+# JWT "purpose" claim of tokens that may only open the dashboard stream
+DASHBOARD_STREAM = "dashboard_stream"
+
+startup_timings: Dict[str, float] = {"imports_ms": round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)}
+background_startup = []
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global client, database, stripe_service, convertkit_service
+    global client, database, stale_database, stripe_service, convertkit_service, lead_service, export_service, analytics_service, dashboard_feed, prompt_render_service, entitlement_service, similarity_service, engagement_service, retention_service, catalog_import_service, rate_limiter, health_monitor
+    
+    lifespan_started = time.perf_counter()
     
     # Connect to MongoDB
     mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-    client = AsyncIOMotorClient(mongo_url)
+    client = AsyncIOMotorClient(
+        mongo_url,
+        event_listeners=[MongoCommandTracer(tracer), MongoTimeoutListener(), pool_monitor],
+        **client_options()
+    )
     database = client.bizpromptai
+    stale_database = stale_reads(database)
     
     # Initialize services
-    stripe_service = StripePaymentService(database)
+    analytics_service = AnalyticsService(database)
+    entitlement_service = EntitlementService(database)
+    stripe_service = StripePaymentService(database, analytics_service, entitlement_service)
     convertkit_service = ConvertKitService()
+    lead_service = LeadCaptureService(database, convertkit_service, analytics_service)
+    export_service = ExportService(database)
+    dashboard_feed = DashboardFeed(database)
+    prompt_render_service = PromptRenderService(database)
+    similarity_service = SimilarityService(database)
+    engagement_service = EngagementScoringService(database, convertkit_service)
+    retention_service = RetentionService(database)
+    catalog_import_service = CatalogImportService(database, entitlement_service)
+    rate_limiter = create_rate_limiter(database)
     
-    # Initialize sample data
-    await initialize_sample_data()
+    # Dependency checks run in the background; probes only read their cached results
+    upstream_interval = float(os.getenv("HEALTH_UPSTREAM_INTERVAL", "60"))
+    health_monitor = HealthMonitor()
+    health_monitor.register("mongo", lambda: database.command("ping"))
+    health_monitor.register("convertkit", convertkit_service.ping, interval=upstream_interval, enabled=bool(convertkit_service.api_key))
+    health_monitor.register("stripe", stripe_service.ping, interval=upstream_interval, enabled=bool(stripe_service.api_key))
+    health_monitor.start()
     
-    logger.info("BizPromptAI backend started successfully")
+    # Work spawned by endpoints; drained (and checkpointed if need be) on shutdown
+    task_supervisor.register("lead.enroll", lead_service.enroll)
+    task_supervisor.register("lead.enroll_import", lead_service.enroll_import)
+    task_supervisor.register("stripe.webhook", stripe_service.handle_webhook)
+    task_supervisor.register("engagement.run", engagement_service.run)
+    task_supervisor.register("retention.run", retention_service.run)
+    task_supervisor.register("similarity.refresh", similarity_service.refresh)
+    task_supervisor.register("analytics.rebuild", analytics_service.rebuild)
+    # SIGTERM starts the drain (see runner.py); readiness fails from that moment
+    task_supervisor.add_drain_listener(health_monitor.begin_drain)
+    task_supervisor.start(database)
+    # Build the similarity index ahead of the first related-prompts request
+    task_supervisor.spawn("similarity.refresh")
+    
+    # Index builds and seeding talk to Mongo, so they run after startup instead of blocking it
+    background_startup.append(asyncio.create_task(ensure_indexes()))
+    if os.getenv("SEED_SAMPLE_DATA", "true").lower() == "true":
+        background_startup.append(asyncio.create_task(run_once(database, "sample_data", seed_sample_data)))
+    
+    startup_timings["lifespan_ms"] = round((time.perf_counter() - lifespan_started) * 1000, 1)
+    logger.info(
+        f"BizPromptAI backend started in {startup_timings['lifespan_ms']}ms "
+        f"(imports {startup_timings['imports_ms']}ms)"
+    )
     yield
     
     # Shutdown
+    if health_monitor:
+        await health_monitor.stop()
+    await task_supervisor.drain()
+    for task in background_startup:
+        task.cancel()
+    if dashboard_feed:
+        await dashboard_feed.stop()
+    if convertkit_service:
+        await convertkit_service.close()
     if client:
         client.close()
+    tracer.shutdown()
 
 app = FastAPI(
     title="BizPromptAI Backend",
@@ -66,6 +169,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-request deadline for Mongo and outbound calls; innermost so CORS headers still wrap 504s
+app.add_middleware(DeadlineMiddleware)
+
+# gzip/brotli for responses over COMPRESSION_MIN_SIZE; precompressed responses pass through
+app.add_middleware(CompressionMiddleware)
+
 # CORS setup
 app.add_middleware(
     CORSMiddleware,
@@ -75,62 +184,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-async def initialize_sample_data():
-    """Initialize sample data for development"""
+# Request tracing (sampled via TRACE_SAMPLE_RATE)
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
+async def ensure_indexes():
+    """Create indexes once per process; safe to repeat across workers"""
+    started = time.perf_counter()
     try:
-        # Check if admin user exists
-        admin_user = await database.users.find_one({"email": "admin@bizpromptai.com"})
-        if not admin_user:
-            # Create admin user
-            hashed_password = bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt())
-            admin = User(
-                email="admin@bizpromptai.com",
-                name="Admin User",
-                role="admin"
-            )
-            await database.users.insert_one({
-                **admin.dict(),
-                "password": hashed_password.decode('utf-8')
-            })
-            logger.info("Created admin user")
-        
-        # Check if prompts exist
-        prompts_count = await database.prompts.count_documents({})
-        if prompts_count == 0:
-            # Create sample prompts
-            sample_prompts = [
-                Prompt(
-                    title="Email Marketing Campaign Creator",
-                    content="Create a comprehensive email marketing campaign for [PRODUCT/SERVICE] targeting [TARGET AUDIENCE]. Include subject lines, email sequences, and call-to-action strategies.",
-                    category="Marketing",
-                    tags=["email", "marketing", "campaigns"]
-                ),
-                Prompt(
-                    title="Social Media Content Planner",
-                    content="Generate a 30-day social media content calendar for [BUSINESS TYPE] focusing on [GOALS]. Include post ideas, hashtags, and engagement strategies.",
-                    category="Social Media",
-                    tags=["social media", "content", "planning"]
-                ),
-                Prompt(
-                    title="Business Process Optimizer",
-                    content="Analyze and optimize the [BUSINESS PROCESS] for [COMPANY]. Identify bottlenecks, suggest improvements, and create implementation timeline.",
-                    category="Operations",
-                    tags=["process", "optimization", "efficiency"]
-                )
-            ]
-            
-            for prompt in sample_prompts:
-                await database.prompts.insert_one(prompt.dict())
-            
-            logger.info("Created sample prompts")
-            
+        await lead_service.ensure_indexes()
+        # Mixed-case legacy emails don't trip the unique index; lowercase them once per database
+        await run_once(database, "lead_email_lowercase", lead_service.lowercase_legacy_emails, lease_seconds=600)
+        await export_service.ensure_indexes()
+        await analytics_service.ensure_indexes()
+        await engagement_service.ensure_indexes()
+        await retention_service.ensure_indexes()
+        await catalog_import_service.ensure_indexes()
+        startup_timings["indexes_ms"] = round((time.perf_counter() - started) * 1000, 1)
     except Exception as e:
-        logger.error(f"Failed to initialize sample data: {str(e)}")
+        logger.error(f"Failed to create indexes: {str(e)}")
 
 # Authentication endpoints
 @app.post("/api/auth/register")
-async def register(user_data: dict):
+async def register(user_data: dict, http_request: Request):
     """Register new user"""
+    if rate_limiter:
+        await rate_limiter.enforce("register", http_request, user_data.get("email"))
+    
     try:
         # Check if user exists
         existing_user = await database.users.find_one({"email": user_data["email"]})
@@ -183,11 +262,14 @@ async def register(user_data: dict):
         raise HTTPException(status_code=500, detail="Registration failed")
 
 @app.post("/api/auth/login")
-async def login(credentials: dict):
+async def login(credentials: dict, http_request: Request):
     """Login user"""
+    if rate_limiter:
+        await rate_limiter.enforce("login", http_request, credentials.get("email"))
+    
     try:
         # Find user
-        user_data = await database.users.find_one({"email": credentials["email"]})
+        user_data = await database.users.find_one({"email": credentials["email"]}, {"_id": 0})
         if not user_data:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
@@ -214,28 +296,69 @@ async def login(credentials: dict):
         logger.error(f"Login failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Login failed")
 
+def get_token_user_id(request: Request) -> Optional[str]:
+    """User id from a valid bearer token, or None for anonymous requests (no database lookup)"""
+    auth_header = request.headers.get("authorization", "")
+    if not auth_header.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(auth_header[7:], os.getenv("SECRET_KEY", "secret"), algorithms=["HS256"])
+    except jwt.PyJWTError:
+        return None
+    if payload.get("purpose"):
+        return None
+    return payload.get("user_id")
+
+async def _admin_from_token(token: Optional[str], purpose: Optional[str] = None) -> Dict[str, Any]:
+    """Resolve a session token (or a single-purpose token, if `purpose` is given) to an admin user"""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    try:
+        payload = jwt.decode(token, os.getenv("SECRET_KEY", "secret"), algorithms=["HS256"])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("purpose") != purpose:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    user = await database.users.find_one({"id": payload.get("user_id")}, {"_id": 0, "password": 0})
+    if not user or user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+async def require_admin(request: Request) -> Dict[str, Any]:
+    """Resolve the bearer token to an admin user or reject the request"""
+    auth_header = request.headers.get("authorization", "")
+    return await _admin_from_token(auth_header[7:] if auth_header.lower().startswith("bearer ") else None)
+
+async def require_stream_admin(request: Request) -> Dict[str, Any]:
+    """Admin check for event streams: a bearer token, or a short-lived stream token in the query string"""
+    auth_header = request.headers.get("authorization", "")
+    if auth_header.lower().startswith("bearer "):
+        return await _admin_from_token(auth_header[7:])
+    # EventSource cannot send headers; the query string ends up in access logs, so only accept
+    # a token that expires within DASHBOARD_STREAM_TOKEN_TTL and opens nothing but the stream
+    return await _admin_from_token(request.query_params.get("stream_token"), purpose=DASHBOARD_STREAM)
+
 # Lead magnet endpoints
 @app.post("/api/lead-magnet")
 async def lead_magnet_signup(
     request: SubscribeRequest,
-    background_tasks: BackgroundTasks
+    http_request: Request
 ):
     """Handle lead magnet signup"""
+    if rate_limiter:
+        await rate_limiter.enforce("lead_magnet", http_request, request.email)
+    
     try:
-        # Store lead in database
-        lead = LeadMagnetSignup(
-            email=request.email,
-            name=request.first_name,
-            magnet_type=request.magnet_type,
-            source_page=request.source_page
-        )
-        
-        await database.lead_magnets.insert_one(lead.dict())
-        
-        # Process ConvertKit signup in background
-        if convertkit_service:
-            background_tasks.add_task(
-                convertkit_service.process_lead_magnet_signup,
+        # Upsert lead on (email, magnet_type); repeat submissions only bump counters
+        lead, should_enroll = await lead_service.capture(request)
+        
+        # Process ConvertKit signup in background, once per lead
+        if should_enroll:
+            task_supervisor.spawn(
+                "lead.enroll",
+                lead["id"],
                 request.email,
                 request.first_name,
                 request.magnet_type or "general"
@@ -244,13 +367,109 @@ async def lead_magnet_signup(
         return {
             "success": True,
             "message": "Successfully subscribed! Check your email for your free prompts.",
-            "lead_id": lead.id
+            "lead_id": lead["id"]
         }
         
     except Exception as e:
         logger.error(f"Lead magnet signup failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Signup failed")
 
+@app.post("/api/admin/leads/import")
+async def import_leads(
+    http_request: Request,
+    format: Optional[str] = None,
+    magnet_type: Optional[str] = None,
+    source_page: str = "import",
+    enroll: bool = True,
+    admin: Dict[str, Any] = Depends(require_admin)
+):
+    """Bulk import leads from a streamed CSV or NDJSON request body"""
+    content_type = http_request.headers.get("content-type", "")
+    import_format = (format or "").lower()
+    if not import_format:
+        if "csv" in content_type:
+            import_format = "csv"
+        elif "ndjson" in content_type or "jsonl" in content_type:
+            import_format = "ndjson"
+    if import_format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Body must be CSV or NDJSON (set Content-Type or ?format=)")
+    
+    try:
+        parse = iter_csv_records if import_format == "csv" else iter_ndjson_records
+        summary = await lead_service.import_records(
+            parse(http_request.stream()),
+            magnet_type=magnet_type,
+            source_page=source_page,
+            enroll=enroll
+        )
+        
+        # Enroll new leads in ConvertKit in chunks after responding
+        if summary["enrollment_queued"]:
+            task_supervisor.spawn("lead.enroll_import", summary["import_id"])
+        
+        return summary
+        
+    except Exception as e:
+        logger.error(f"Lead import failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Lead import failed")
+
+@app.post("/api/admin/leads/score")
+async def score_leads(admin: Dict[str, Any] = Depends(require_admin)):
+    """Recompute lead engagement scores and tag high_engagement leads in ConvertKit"""
+    if engagement_service.running:
+        raise HTTPException(status_code=409, detail="Lead scoring already running")
+    
+    task_supervisor.spawn("engagement.run")
+    return {"success": True, "message": "Lead scoring started"}
+
+@app.get("/api/admin/retention")
+async def retention_status(admin: Dict[str, Any] = Depends(require_admin)):
+    """Archival policies, how many documents are due, and the last run on this worker"""
+    try:
+        return {
+            "policies": {dataset: {"days": policy["days"]} for dataset, policy in retention_service.policies.items()},
+            "due": await retention_service.preview(),
+            "running": retention_service.running,
+            "last_run": retention_service.last_run
+        }
+    except Exception as e:
+        logger.error(f"Retention status failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Retention status unavailable")
+
+@app.post("/api/admin/retention/run")
+async def run_retention(admin: Dict[str, Any] = Depends(require_admin)):
+    """Move cold leads and expired pending transactions to the archive"""
+    if retention_service.running:
+        raise HTTPException(status_code=409, detail="Retention already running")
+    
+    task_supervisor.spawn("retention.run")
+    return {"success": True, "message": "Retention run started"}
+
+@app.post("/api/admin/prompts/import")
+async def import_prompts(
+    http_request: Request,
+    prune: bool = False,
+    dry_run: bool = False,
+    admin: Dict[str, Any] = Depends(require_admin)
+):
+    """Publish a prompt catalog (JSON array or NDJSON of prompts), writing only new and changed prompts"""
+    try:
+        summary = await catalog_import_service.import_catalog(
+            parse_catalog(await http_request.body()),
+            prune=prune,
+            dry_run=dry_run
+        )
+        if not dry_run and (summary["inserted"] or summary["updated"] or summary["deleted"]):
+            task_supervisor.spawn("similarity.refresh")
+        return {"success": True, **summary}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Prompt catalog import failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Prompt catalog import failed")
+
 # Payment endpoints
 @app.post("/api/payments/create-checkout")
 async def create_payment_checkout(
@@ -262,9 +481,15 @@ async def create_payment_checkout(
         if not stripe_service:
             raise HTTPException(status_code=500, detail="Payment service not available")
         
-        # Get user email from request (could be from auth or form)
-        email = getattr(user_request.state, 'user_email', 'customer@bizpromptai.com')
-        user_id = getattr(user_request.state, 'user_id', None)
+        # Signed-in buyers are recorded by id and stored email, so their purchase unlocks premium access
+        email = 'customer@bizpromptai.com'
+        user_id = get_token_user_id(user_request)
+        if user_id:
+            user = await database.users.find_one({"id": user_id}, {"_id": 0, "email": 1})
+            if user:
+                email = user["email"]
+            else:
+                user_id = None
         
         # Create checkout session
         result = await stripe_service.create_checkout_session(
@@ -306,10 +531,26 @@ async def get_payment_status(session_id: str):
         logger.error(f"Payment status check failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Status check failed")
 
+@app.post("/api/payments/status:batch")
+async def get_payment_status_batch(request: PaymentStatusBatchRequest, admin: Dict[str, Any] = Depends(require_admin)):
+    """Statuses for many checkout sessions in one call (support tooling)"""
+    try:
+        if not stripe_service:
+            raise HTTPException(status_code=500, detail="Payment service not available")
+        
+        return await stripe_service.get_payment_statuses(request.session_ids)
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch payment status check failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Status check failed")
+
 @app.post("/api/webhook/stripe")
 async def stripe_webhook(
-    request: Request,
-    background_tasks: BackgroundTasks
+    request: Request
 ):
     """Handle Stripe webhook events"""
     try:
@@ -321,8 +562,8 @@ async def stripe_webhook(
         signature = request.headers.get("stripe-signature", "")
         
         # Process webhook in background
-        background_tasks.add_task(
-            stripe_service.handle_webhook,
+        task_supervisor.spawn(
+            "stripe.webhook",
             body,
             signature
         )
@@ -335,30 +576,102 @@ async def stripe_webhook(
 
 # Prompt endpoints
 @app.get("/api/prompts")
-async def get_prompts(category: Optional[str] = None):
-    """Get available prompts"""
+async def get_prompts(request: Request, category: Optional[str] = None):
+    """Get available prompts; premium content is only included for entitled users"""
     try:
-        query = {"category": category} if category else {}
-        prompts = await database.prompts.find(query).to_list(length=None)
-        return {"prompts": prompts}
+        user_id = get_token_user_id(request)
+        tier = await entitlement_service.get_tier(user_id)
+        catalog, encoding, etag = await entitlement_service.get_catalog(
+            tier, category, accepted_encodings(request.headers.get("accept-encoding"))
+        )
+        
+        # Anonymous catalogs are the same for everyone, so shared caches (CDNs) may keep them
+        max_age = int(os.getenv("CATALOG_CACHE_MAX_AGE", "60"))
+        headers = {
+            "Cache-Control": f"public, max-age={max_age}, stale-while-revalidate={max_age * 5}" if user_id is None else f"private, max-age={max_age}",
+            "Vary": "Accept-Encoding, Authorization"
+        }
+        if etag:
+            headers["ETag"] = etag
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+        if encoding != IDENTITY:
+            headers["Content-Encoding"] = encoding
+        return BufferResponse(content=catalog, media_type="application/json", headers=headers)
         
     except Exception as e:
         logger.error(f"Failed to fetch prompts: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch prompts")
 
+@app.get("/api/prompts/{prompt_id}/related")
+async def get_related_prompts(prompt_id: str, request: Request, limit: int = 5):
+    """Most similar prompts by title, tags and content"""
+    try:
+        tier = await entitlement_service.get_tier(get_token_user_id(request))
+        related = await similarity_service.related(prompt_id, limit)
+        if related is None:
+            raise HTTPException(status_code=404, detail="Prompt not found")
+        
+        return {
+            "prompt_id": prompt_id,
+            "related": [{**prompt, "locked": not entitlement_service.can_access(tier, prompt)} for prompt in related]
+        }
+        
+    except HTTPException:
+        raise
+    except IndexUnavailableError:
+        raise HTTPException(status_code=503, detail="Related prompts temporarily unavailable")
+    except Exception as e:
+        logger.error(f"Related prompts lookup failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch related prompts")
+
+@app.post("/api/prompts/{prompt_id}/render")
+async def render_prompt(prompt_id: str, request: PromptRenderRequest, http_request: Request):
+    """Fill a prompt's [PLACEHOLDER] variables"""
+    try:
+        tier = await entitlement_service.get_tier(get_token_user_id(http_request))
+        return await prompt_render_service.render(prompt_id, request.variables, tier)
+        
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Premium prompt requires a purchase")
+    except TemplateVariablesError as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "missing": e.missing})
+    except Exception as e:
+        logger.error(f"Prompt render failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to render prompt")
+
+@app.post("/api/prompts/{prompt_id}/render:batch")
+async def render_prompt_batch(prompt_id: str, request: PromptBatchRenderRequest, http_request: Request):
+    """Render one prompt against many variable sets in a single call"""
+    try:
+        tier = await entitlement_service.get_tier(get_token_user_id(http_request))
+        return await prompt_render_service.render_batch(prompt_id, request.variable_sets, tier)
+        
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Premium prompt requires a purchase")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch prompt render failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to render prompts")
+
 # Admin endpoints
 @app.get("/api/admin/dashboard")
 async def admin_dashboard():
     """Get admin dashboard data"""
     try:
         # Get counts
-        users_count = await database.users.count_documents({})
-        leads_count = await database.lead_magnets.count_documents({})
-        transactions_count = await database.payment_transactions.count_documents({})
+        users_count = await stale_database.users.count_documents({})
+        leads_count = await stale_database.lead_magnets.count_documents({})
+        transactions_count = await stale_database.payment_transactions.count_documents({})
         
         # Get recent activity
-        recent_users = await database.users.find().sort("created_at", -1).limit(5).to_list(length=5)
-        recent_leads = await database.lead_magnets.find().sort("created_at", -1).limit(5).to_list(length=5)
+        recent_users = await stale_database.users.find().sort("created_at", -1).limit(5).to_list(length=5)
+        recent_leads = await stale_database.lead_magnets.find().sort("created_at", -1).limit(5).to_list(length=5)
         
         return {
             "stats": {
@@ -376,25 +689,149 @@ async def admin_dashboard():
         logger.error(f"Admin dashboard failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Dashboard data unavailable")
 
+@app.post("/api/admin/dashboard/stream-token")
+async def admin_dashboard_stream_token(admin: Dict[str, Any] = Depends(require_admin)):
+    """Short-lived token for opening the dashboard stream from EventSource (?stream_token=)"""
+    ttl = int(os.getenv("DASHBOARD_STREAM_TOKEN_TTL", "60"))
+    token = jwt.encode(
+        {"user_id": admin["id"], "purpose": DASHBOARD_STREAM, "exp": datetime.now(timezone.utc) + timedelta(seconds=ttl)},
+        os.getenv("SECRET_KEY", "secret"),
+        algorithm="HS256"
+    )
+    return {"stream_token": token, "expires_in": ttl}
+
+@app.get("/api/admin/dashboard/stream")
+async def admin_dashboard_stream(
+    request: Request,
+    admin: Dict[str, Any] = Depends(require_stream_admin)
+):
+    """Server-sent events: a dashboard snapshot, then incremental counter and activity updates"""
+    queue = await dashboard_feed.subscribe()
+    
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                    yield format_sse(message)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+        finally:
+            dashboard_feed.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/admin/metrics")
+async def admin_metrics(admin: Dict[str, Any] = Depends(require_admin)):
+    """Operational counters for this worker"""
+    return {
+        "pid": os.getpid(),
+        "timeouts": deadlines.metrics(),
+        "logging": log_setup.stats(),
+        "mongo_pool": pool_monitor.metrics(),
+        "background": task_supervisor.stats()
+    }
+
+@app.get("/api/admin/analytics")
+async def admin_analytics(
+    metric: str = "signups",
+    granularity: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    admin: Dict[str, Any] = Depends(require_admin)
+):
+    """Signups per source page / magnet type, or revenue per product type, from rollup buckets"""
+    if metric not in ("signups", "revenue"):
+        raise HTTPException(status_code=400, detail="Metric must be signups or revenue")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Granularity must be hour or day")
+    
+    try:
+        return await analytics_service.get_series(metric, granularity, start=start, end=end)
+        
+    except Exception as e:
+        logger.error(f"Analytics query failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Analytics unavailable")
+
+@app.post("/api/admin/analytics/rebuild")
+async def rebuild_analytics(
+    admin: Dict[str, Any] = Depends(require_admin)
+):
+    """Recompute analytics rollups from the raw lead and transaction collections"""
+    task_supervisor.spawn("analytics.rebuild")
+    return {"status": "rebuilding"}
+
+@app.get("/api/admin/export/{dataset}")
+async def export_data(
+    dataset: str,
+    format: str = "csv",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    admin: Dict[str, Any] = Depends(require_admin)
+):
+    """Stream leads or transactions (live, or archived via leads_archive / transactions_archive) as CSV or NDJSON"""
+    if dataset not in export_service.exports:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {dataset}")
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
+    
+    try:
+        field_list = export_service.resolve_fields(dataset, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    documents = export_service.iter_documents(dataset, field_list, start=start, end=end)
+    if format == "csv":
+        body, media_type = encode_csv(documents, field_list), "text/csv"
+    else:
+        body, media_type = encode_ndjson(documents, field_list), "application/x-ndjson"
+    
+    filename = f"{dataset}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # Health check
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health summary from the cached dependency checks"""
+    ready, readiness = health_monitor.readiness()
+    services = readiness["services"]
+    labels = {"up": "connected", "down": "error", "unconfigured": "not configured", "pending": "checking"}
+    degraded = any(entry["status"] == "down" for entry in services.values())
     return {
-        "status": "healthy",
+        "status": "unhealthy" if not ready else "degraded" if degraded else "healthy",
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "services": {
-            "database": "connected" if database is not None else "disconnected",
-            "stripe": "configured" if stripe_service is not None else "not configured",
-            "convertkit": "configured" if convertkit_service is not None and convertkit_service.api_key else "not configured"
-        }
+            "database": labels[services["mongo"]["status"]],
+            "stripe": labels[services["stripe"]["status"]],
+            "convertkit": labels[services["convertkit"]["status"]]
+        },
+        "checks": services,
+        "startup": startup_timings
     }
 
+@app.get("/api/health/live")
+async def liveness_probe():
+    """Liveness: the worker is up and its event loop is answering"""
+    return health_monitor.liveness()
+
+@app.get("/api/health/ready")
+async def readiness_probe():
+    """Readiness: critical dependencies were reachable on their last check"""
+    ready, body = health_monitor.readiness()
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
 if __name__ == "__main__":
-    uvicorn.run(
-        "server:app",
-        host="0.0.0.0",
-        port=8001,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+    # Multi-worker supervisor; pass --reload for the single-process development server
+    from runner import main
+    main()
\ No newline at end of file
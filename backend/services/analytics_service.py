@@ -0,0 +1,238 @@
+import os
+import socket
+from typing import Dict, Any, List, Optional, Iterable
+from datetime import datetime, timedelta, timezone
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+import logging
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("hour", "day")
+
+# Lead attributes broken out in the signup rollups
+SIGNUP_DIMENSIONS = ("source_page", "magnet_type")
+
+REBUILD_LEASE_ID = "analytics_rebuild"
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; make query bounds comparable with them"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = naive_utc(moment)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def dimension_key(value: Any) -> str:
+    """Make a lead attribute safe to use as a Mongo field name"""
+    if value in (None, ""):
+        return "unknown"
+    return str(value).replace(".", "_").replace("$", "_")
+
+
+class AnalyticsService:
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.db = database
+        self.rollups = database.analytics_rollups
+        self.rebuild_lease_seconds = float(os.getenv("ANALYTICS_REBUILD_LEASE_SECONDS", "3600"))
+
+    async def ensure_indexes(self) -> None:
+        await self.rollups.create_index([("metric", 1), ("granularity", 1), ("bucket", 1)])
+
+    def _bucket_ops(self, metric: str, moment: datetime, increments: Dict[str, float]) -> List[UpdateOne]:
+        return [
+            self._single_bucket_op(metric, granularity, bucket_start(moment, granularity), increments)
+            for granularity in GRANULARITIES
+        ]
+
+    def _signup_increments(self, leads: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+        increments: Dict[str, float] = {}
+        for lead in leads:
+            increments["total"] = increments.get("total", 0) + 1
+            for dimension in SIGNUP_DIMENSIONS:
+                key = f"by_{dimension}.{dimension_key(lead.get(dimension))}"
+                increments[key] = increments.get(key, 0) + 1
+        return increments
+
+    async def record_signups(self, leads: List[Dict[str, Any]], moment: Optional[datetime] = None) -> None:
+        """Count new leads into the hourly and daily signup buckets"""
+        if not leads:
+            return
+        try:
+            ops = self._bucket_ops("signups", moment or datetime.utcnow(), self._signup_increments(leads))
+            await self.rollups.bulk_write(ops, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to record signup rollup: {str(e)}")
+
+    async def record_revenue(self, transaction: Dict[str, Any]) -> None:
+        """Add a completed transaction to the hourly and daily revenue buckets"""
+        try:
+            product_type = dimension_key((transaction.get("metadata") or {}).get("product_type"))
+            amount = float(transaction.get("amount") or 0)
+            increments = {
+                "total": amount,
+                "count": 1,
+                f"by_product_type.{product_type}": amount,
+                f"count_by_product_type.{product_type}": 1
+            }
+            moment = transaction.get("completed_at") or datetime.utcnow()
+            await self.rollups.bulk_write(self._bucket_ops("revenue", moment, increments), ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to record revenue rollup: {str(e)}")
+
+    async def get_series(
+        self,
+        metric: str,
+        granularity: str = "day",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Read pre-aggregated buckets for a date range"""
+        end = end or datetime.utcnow()
+        start = start or end - timedelta(days=30)
+        cursor = self.rollups.find(
+            {
+                "metric": metric,
+                "granularity": granularity,
+                "bucket": {"$gte": bucket_start(start, granularity), "$lt": naive_utc(end)}
+            },
+            {"_id": 0, "metric": 0, "granularity": 0}
+        ).sort("bucket", 1)
+        series = await cursor.to_list(length=None)
+
+        totals: Dict[str, Any] = {}
+        for point in series:
+            for key, value in point.items():
+                if key == "bucket":
+                    continue
+                if isinstance(value, dict):
+                    breakdown = totals.setdefault(key, {})
+                    for name, amount in value.items():
+                        breakdown[name] = breakdown.get(name, 0) + amount
+                else:
+                    totals[key] = totals.get(key, 0) + value
+
+        return {
+            "metric": metric,
+            "granularity": granularity,
+            "start": start,
+            "end": end,
+            "totals": totals,
+            "series": series
+        }
+
+    async def rebuild(self) -> Dict[str, int]:
+        """Recompute every bucket from the raw collections (backfill or repair)
+
+        Buckets are built in a staging collection and renamed over the live one, so
+        readers never see a half-built rollup. Events recorded during the build are
+        aggregated again after the swap; one recorded while the swap itself happens
+        can be counted twice or missed, so rebuild when traffic is quiet. One rebuild
+        runs at a time across all workers.
+        """
+        if not await self._acquire_rebuild_lease():
+            logger.warning("Analytics rebuild already running on another worker")
+            return {"buckets": 0}
+        try:
+            staging = self.db[f"{self.rollups.name}_rebuild"]
+            await staging.drop()
+            cutoff = datetime.utcnow()
+            buckets = await self._aggregate_into(staging, {"$lt": cutoff})
+            await staging.create_index([("metric", 1), ("granularity", 1), ("bucket", 1)])
+
+            swapped = datetime.utcnow()
+            await staging.rename(self.rollups.name, dropTarget=True)
+            # Live increments between the cutoff and the swap went to the replaced collection; count them again
+            await self._aggregate_into(self.rollups, {"$gte": cutoff, "$lt": swapped})
+        finally:
+            await self._release_rebuild_lease()
+
+        logger.info(f"Rebuilt {buckets} analytics buckets")
+        return {"buckets": buckets}
+
+    async def _acquire_rebuild_lease(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.db.maintenance_leases.update_one(
+                {"_id": REBUILD_LEASE_ID, "lease_until": {"$lt": now}},
+                {"$set": {
+                    "owner": f"{socket.gethostname()}:{os.getpid()}",
+                    "lease_until": now + timedelta(seconds=self.rebuild_lease_seconds)
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def _release_rebuild_lease(self) -> None:
+        await self.db.maintenance_leases.update_one({"_id": REBUILD_LEASE_ID}, {"$set": {"lease_until": datetime.utcnow()}})
+
+    async def _aggregate_into(self, target, window: Dict[str, datetime]) -> int:
+        """Add signups created and revenue completed within `window` to the target's buckets"""
+        # Imported here: retention_service depends on lead_service, which depends on this module
+        from services.retention_service import archive_collection
+
+        buckets = 0
+        for granularity in GRANULARITIES:
+            date_format = "%Y-%m-%dT%H:00:00" if granularity == "hour" else "%Y-%m-%dT00:00:00"
+            bucket_expr = {"$dateFromString": {"dateString": {"$dateToString": {"format": date_format, "date": "$created_at"}}}}
+
+            for dimension in SIGNUP_DIMENSIONS:
+                pipeline = [
+                    {"$match": {"created_at": window}},
+                    # Signups archived by RetentionService still count
+                    {"$unionWith": {"coll": archive_collection("lead_magnets"), "pipeline": [{"$match": {"created_at": window}}]}},
+                    {"$group": {"_id": {"bucket": bucket_expr, "value": f"${dimension}"}, "count": {"$sum": 1}}}
+                ]
+                ops = []
+                async for row in self.db.lead_magnets.aggregate(pipeline, allowDiskUse=True):
+                    bucket = row["_id"]["bucket"]
+                    increments = {f"by_{dimension}.{dimension_key(row['_id'].get('value'))}": row["count"]}
+                    if dimension == SIGNUP_DIMENSIONS[0]:
+                        increments["total"] = row["count"]
+                    ops.append(self._single_bucket_op("signups", granularity, bucket, increments))
+                if ops:
+                    result = await target.bulk_write(ops, ordered=False)
+                    buckets += result.upserted_count
+
+            completed_expr = {"$dateFromString": {"dateString": {"$dateToString": {"format": date_format, "date": "$completed_at"}}}}
+            pipeline = [
+                {"$match": {"payment_status": "completed", "completed_at": {"$ne": None, **window}}},
+                {"$group": {
+                    "_id": {"bucket": completed_expr, "product_type": "$metadata.product_type"},
+                    "total": {"$sum": "$amount"},
+                    "count": {"$sum": 1}
+                }}
+            ]
+            ops = []
+            async for row in self.db.payment_transactions.aggregate(pipeline, allowDiskUse=True):
+                product_type = dimension_key(row["_id"].get("product_type"))
+                ops.append(self._single_bucket_op("revenue", granularity, row["_id"]["bucket"], {
+                    "total": row["total"],
+                    "count": row["count"],
+                    f"by_product_type.{product_type}": row["total"],
+                    f"count_by_product_type.{product_type}": row["count"]
+                }))
+            if ops:
+                result = await target.bulk_write(ops, ordered=False)
+                buckets += result.upserted_count
+        return buckets
+
+    def _single_bucket_op(self, metric: str, granularity: str, bucket: datetime, increments: Dict[str, float]) -> UpdateOne:
+        return UpdateOne(
+            {"_id": f"{metric}:{granularity}:{bucket.isoformat()}"},
+            {
+                "$inc": increments,
+                "$setOnInsert": {"metric": metric, "granularity": granularity, "bucket": bucket}
+            },
+            upsert=True
+        )
@@ -0,0 +1,168 @@
+import json
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DeleteMany, UpdateOne, ReturnDocument
+from pydantic import ValidationError
+from models import Prompt
+from services.entitlement_service import EntitlementService, CATALOG_META, CATALOG_META_ID, stored_catalog_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Fields that make up a prompt's content; a change to any of them is a new prompt version
+CONTENT_FIELDS = ("title", "content", "category", "tags", "is_premium")
+
+# Errors listed in a rejected import before the rest are summarised
+MAX_REPORTED_ERRORS = 20
+
+
+def content_hash(prompt: Dict[str, Any]) -> str:
+    canonical = json.dumps({field: prompt.get(field) for field in CONTENT_FIELDS}, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def parse_catalog(data: bytes) -> List[Dict[str, Any]]:
+    """Records from a JSON array, a {"prompts": [...]} document, or NDJSON"""
+    try:
+        document = json.loads(data)
+    except ValueError:
+        records = []
+        for number, line in enumerate(data.decode("utf-8").splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"Line {number}: invalid JSON: {str(e)}")
+        return records
+    if isinstance(document, dict):
+        document = document.get("prompts")
+    if not isinstance(document, list):
+        raise ValueError('Catalog must be a JSON array, {"prompts": [...]}, or NDJSON')
+    return document
+
+
+class CatalogImportService:
+    def __init__(self, database: AsyncIOMotorDatabase, entitlement_service: Optional[EntitlementService] = None):
+        self.db = database
+        self.entitlement_service = entitlement_service
+        self._lock = asyncio.Lock()
+
+    async def ensure_indexes(self) -> None:
+        # Imports upsert by id, so ids must be unique
+        await self.db.prompts.create_index("id", unique=True)
+        # Readers treat a missing version as 1; store it so imports bump it to 2, not 1
+        result = await self.db.prompts.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+        if result.modified_count:
+            logger.info(f"Backfilled version on {result.modified_count} prompts")
+
+    def validate(self, records: Iterable[Any]) -> List[Prompt]:
+        """Parse every record, rejecting the whole catalog if any record is invalid"""
+        prompts: List[Prompt] = []
+        errors: List[str] = []
+        seen = set()
+        for index, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors.append(f"Record {index}: expected an object")
+                continue
+            if not record.get("id"):
+                # Without a stable id every import would insert the prompt again
+                errors.append(f"Record {index}: id is required")
+                continue
+            if record["id"] in seen:
+                errors.append(f"Record {index}: duplicate id {record['id']}")
+                continue
+            seen.add(record["id"])
+            try:
+                prompts.append(Prompt(**record))
+            except ValidationError as e:
+                fields = ", ".join(".".join(str(part) for part in error["loc"]) for error in e.errors())
+                errors.append(f"Record {index} ({record['id']}): invalid {fields}")
+
+        if errors:
+            more = f" (and {len(errors) - MAX_REPORTED_ERRORS} more)" if len(errors) > MAX_REPORTED_ERRORS else ""
+            raise ValueError("; ".join(errors[:MAX_REPORTED_ERRORS]) + more)
+        return prompts
+
+    async def import_catalog(self, records: Iterable[Any], prune: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+        """Apply only the prompts that are new or whose content changed, in one bulk write
+
+        Changed prompts get their version bumped, so caches keyed by (id, version) keep
+        every unchanged entry. With prune, stored prompts missing from the catalog are deleted.
+        """
+        prompts = self.validate(records)
+        async with self._lock:
+            ids = [prompt.id for prompt in prompts]
+            projection = {"_id": 0, "id": 1, "version": 1, "content_hash": 1, **{field: 1 for field in CONTENT_FIELDS}}
+            stored = {
+                doc["id"]: doc
+                async for doc in self.db.prompts.find({"id": {"$in": ids}}, projection)
+            }
+
+            inserted, updated = [], []
+            for prompt in prompts:
+                doc = prompt.dict()
+                doc["content_hash"] = content_hash(doc)
+                current = stored.get(prompt.id)
+                if current is None:
+                    inserted.append(doc)
+                elif doc["content_hash"] != (current.get("content_hash") or content_hash(current)):
+                    updated.append((doc, current.get("version")))
+            deleted = sorted(set(await self.db.prompts.distinct("id")) - set(ids)) if prune else []
+
+            summary: Dict[str, Any] = {
+                "catalog_version": await stored_catalog_version(self.db),
+                "inserted": [doc["id"] for doc in inserted],
+                "updated": [doc["id"] for doc, _ in updated],
+                "deleted": deleted,
+                "unchanged": len(prompts) - len(inserted) - len(updated),
+                "conflicts": 0,
+                "dry_run": dry_run
+            }
+            if dry_run or not (inserted or updated or deleted):
+                return summary
+
+            now = datetime.utcnow()
+            operations = []
+            for doc in inserted:
+                # $setOnInsert leaves a prompt created concurrently by another import alone
+                operations.append(UpdateOne(
+                    {"id": doc["id"]},
+                    {"$setOnInsert": {**doc, "updated_at": now}},
+                    upsert=True
+                ))
+            for doc, stored_version in updated:
+                fields = {field: doc[field] for field in CONTENT_FIELDS}
+                # Matching the version read above makes a concurrent edit a conflict, not a lost update
+                operations.append(UpdateOne(
+                    {"id": doc["id"], "version": stored_version},
+                    {"$set": {**fields, "content_hash": doc["content_hash"], "version": (stored_version or 1) + 1, "updated_at": now}}
+                ))
+            if deleted:
+                operations.append(DeleteMany({"id": {"$in": deleted}}))
+
+            result = await self.db.prompts.bulk_write(operations, ordered=False)
+            summary["conflicts"] = len(inserted) + len(updated) - result.matched_count - result.upserted_count
+            # Bumped only once the prompts are written, so workers never reload a catalog that isn't there yet
+            if result.upserted_count or result.modified_count or result.deleted_count:
+                summary["catalog_version"] = await self._bump_catalog_version()
+            logger.info(
+                f"Imported prompt catalog version {summary['catalog_version']}: {len(inserted)} inserted, "
+                f"{len(updated)} updated, {len(deleted)} deleted, {summary['unchanged']} unchanged"
+            )
+
+        if self.entitlement_service:
+            self.entitlement_service.invalidate_catalog()
+        return summary
+
+    async def _bump_catalog_version(self) -> int:
+        meta = await self.db[CATALOG_META].find_one_and_update(
+            {"_id": CATALOG_META_ID},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return meta["version"]
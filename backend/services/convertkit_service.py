@@ -1,9 +1,10 @@
 import os
-import aiohttp
 import asyncio
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import logging
+from tracing import tracer
+from deadlines import call_budget, record_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +13,9 @@ class ConvertKitService:
         self.api_key = os.getenv("CONVERTKIT_API_KEY")
         self.api_secret = os.getenv("CONVERTKIT_API_SECRET")
         self.form_id = os.getenv("CONVERTKIT_FORM_ID")
-        self.base_url = "https://api.convertkit.com/v3"
+        self.base_url = os.getenv("CONVERTKIT_API_BASE", "https://api.convertkit.com/v3").rstrip("/")
+        self.timeout = float(os.getenv("CONVERTKIT_TIMEOUT", "5"))
+        self.connect_timeout = float(os.getenv("CONVERTKIT_CONNECT_TIMEOUT", "2"))
         
         # Email sequence IDs (you'll configure these in ConvertKit)
         self.sequences = {
@@ -30,6 +33,33 @@ class ConvertKitService:
             "regular_customer": "10004",
             "high_engagement": "10005"
         }
+        
+        self._session = None
+    
+    async def _get_session(self):
+        """Shared HTTP session, created on first use so aiohttp stays out of startup"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+            )
+        return self._session
+    
+    def _timeout(self):
+        """Per-call timeout, capped by the remaining request deadline"""
+        import aiohttp
+        return aiohttp.ClientTimeout(total=call_budget("convertkit", self.timeout), connect=self.connect_timeout)
+    
+    async def ping(self) -> None:
+        """Cheap authenticated call for the health monitor; raises if ConvertKit is unreachable"""
+        session = await self._get_session()
+        async with session.get(f"{self.base_url}/forms", params={"api_key": self.api_key}) as response:
+            if response.status != 200:
+                raise RuntimeError(f"ConvertKit returned HTTP {response.status}")
+    
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
     
     async def add_subscriber(
         self,
@@ -58,8 +88,10 @@ class ConvertKitService:
             payload.update(custom_fields)
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
+            with tracer.start_span("convertkit POST forms/subscribe", kind="client", attributes={"http.url": url}) as span:
+                session = await self._get_session()
+                async with session.post(url, json=payload, timeout=self._timeout()) as response:
+                    span.set_attribute("http.status_code", response.status)
                     if response.status == 200:
                         data = await response.json()
                         subscriber_id = data.get("subscription", {}).get("subscriber", {}).get("id")
@@ -80,6 +112,9 @@ class ConvertKitService:
                         logger.error(f"ConvertKit API error: {error_data}")
                         return {"success": False, "error": error_data}
                         
+        except asyncio.TimeoutError:
+            record_timeout("convertkit")
+            return {"success": False, "error": "ConvertKit request timed out"}
         except Exception as e:
             logger.error(f"Failed to add subscriber {email}: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -107,8 +142,10 @@ class ConvertKitService:
             payload.update(custom_fields)
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
+            with tracer.start_span("convertkit POST sequences/subscribe", kind="client", attributes={"http.url": url}) as span:
+                session = await self._get_session()
+                async with session.post(url, json=payload, timeout=self._timeout()) as response:
+                    span.set_attribute("http.status_code", response.status)
                     if response.status == 200:
                         data = await response.json()
                         logger.info(f"Added {email} to {sequence_name} sequence")
@@ -118,6 +155,9 @@ class ConvertKitService:
                         logger.error(f"Failed to add to sequence: {error_data}")
                         return {"success": False, "error": error_data}
                         
+        except asyncio.TimeoutError:
+            record_timeout("convertkit")
+            return {"success": False, "error": "ConvertKit request timed out"}
         except Exception as e:
             logger.error(f"Failed to add {email} to sequence {sequence_name}: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -137,8 +177,10 @@ class ConvertKitService:
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
+            with tracer.start_span("convertkit POST tags/subscribe", kind="client", attributes={"http.url": url}) as span:
+                session = await self._get_session()
+                async with session.post(url, json=payload, timeout=self._timeout()) as response:
+                    span.set_attribute("http.status_code", response.status)
                     if response.status == 200:
                         data = await response.json()
                         logger.info(f"Added tag '{tag_name}' to {email}")
@@ -148,6 +190,9 @@ class ConvertKitService:
                         logger.error(f"Failed to add tag: {error_data}")
                         return {"success": False, "error": error_data}
                         
+        except asyncio.TimeoutError:
+            record_timeout("convertkit")
+            return {"success": False, "error": "ConvertKit request timed out"}
         except Exception as e:
             logger.error(f"Failed to add tag {tag_name} to {email}: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -249,8 +294,10 @@ class ConvertKitService:
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
+            with tracer.start_span("convertkit GET subscribers", kind="client", attributes={"http.url": url}) as span:
+                session = await self._get_session()
+                async with session.get(url, params=params, timeout=self._timeout()) as response:
+                    span.set_attribute("http.status_code", response.status)
                     if response.status == 200:
                         data = await response.json()
                         subscribers = data.get("subscribers", [])
@@ -263,6 +310,9 @@ class ConvertKitService:
                         error_data = await response.json()
                         return {"success": False, "error": error_data}
                         
+        except asyncio.TimeoutError:
+            record_timeout("convertkit")
+            return {"success": False, "error": "ConvertKit request timed out"}
         except Exception as e:
             logger.error(f"Failed to get subscriber info for {email}: {str(e)}")
             return {"success": False, "error": str(e)}
\ No newline at end of file
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import asyncio
+from typing import Dict, Any, List, Optional, Set
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
+from streaming import json_default
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Collection -> dashboard counter name
+WATCHED_COLLECTIONS = {
+    "users": "total_users",
+    "lead_magnets": "total_leads",
+    "payment_transactions": "total_transactions"
+}
+
+# Collections whose newest documents appear under recent_activity
+RECENT_ACTIVITY = {"users": "users", "lead_magnets": "leads"}
+
+# Status fields shown on recent-activity entries; other updates never reach the feed
+STATUS_FIELDS = {"lead_magnets": ("convertkit_status",)}
+
+HIDDEN_FIELDS = {"_id": 0, "password": 0}
+
+RECENT_LIMIT = 5
+
+
+class DashboardFeed:
+    """Single change-stream (or polling) tail per process, fanned out to admin dashboard clients"""
+
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.db = database
+        self.poll_interval = float(os.getenv("DASHBOARD_POLL_INTERVAL", "5"))
+        # Counter-only changes (bulk deletes, transactions) are coalesced into one stats event per interval
+        self.stats_interval = float(os.getenv("DASHBOARD_STATS_INTERVAL", "1"))
+        self.client_queue_size = int(os.getenv("DASHBOARD_CLIENT_QUEUE_SIZE", "100"))
+        self.stats: Dict[str, int] = {}
+        self.recent: Dict[str, List[Dict[str, Any]]] = {}
+        self.mode: Optional[str] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self._poll_marks: Dict[str, datetime] = {}
+        # _id of each recent-activity entry, so status updates can find it without a lookup
+        self._recent_ids: Dict[str, List[Any]] = {}
+        self._stats_dirty = False
+        self._stats_sent_at = 0.0
+
+    async def load_snapshot(self) -> None:
+        """Run the dashboard queries once; later changes are applied incrementally"""
+        for collection, counter in WATCHED_COLLECTIONS.items():
+            self.stats[counter] = await self.db[collection].count_documents({})
+        for collection, key in RECENT_ACTIVITY.items():
+            docs = await self.db[collection].find({}, {"password": 0}).sort("created_at", -1).limit(RECENT_LIMIT).to_list(length=RECENT_LIMIT)
+            self._recent_ids[key] = [doc.pop("_id") for doc in docs]
+            self.recent[key] = docs
+        for collection in WATCHED_COLLECTIONS:
+            latest = await self.db[collection].find({}, {"created_at": 1}).sort("created_at", -1).limit(1).to_list(length=1)
+            self._poll_marks[collection] = latest[0]["created_at"] if latest else datetime.min
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"stats": dict(self.stats), "recent_activity": {key: list(docs) for key, docs in self.recent.items()}}
+
+    async def subscribe(self) -> asyncio.Queue:
+        """Register a client; the first message on its queue is the full snapshot"""
+        async with self._start_lock:
+            if self._task is None or self._task.done():
+                await self.load_snapshot()
+                self._task = asyncio.create_task(self._run())
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.client_queue_size)
+        queue.put_nowait({"type": "snapshot", **self.snapshot()})
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _broadcast(self, message: Dict[str, Any]) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow client: replace its backlog with a fresh snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "snapshot", **self.snapshot()})
+
+    def _apply(self, operation: str, collection: str, document: Optional[Dict[str, Any]]) -> None:
+        counter = WATCHED_COLLECTIONS[collection]
+        if operation == "insert":
+            self.stats[counter] = self.stats.get(counter, 0) + 1
+            if collection in RECENT_ACTIVITY and document:
+                key = RECENT_ACTIVITY[collection]
+                self._recent_ids[key] = ([document.get("_id")] + self._recent_ids.get(key, []))[:RECENT_LIMIT]
+                document = {k: v for k, v in document.items() if k not in HIDDEN_FIELDS}
+                self.recent[key] = ([document] + self.recent.get(key, []))[:RECENT_LIMIT]
+        elif operation == "delete":
+            self.stats[counter] = max(0, self.stats.get(counter, 0) - 1)
+
+        self._broadcast({
+            "type": operation,
+            "collection": collection,
+            "document": document,
+            "stats": dict(self.stats)
+        })
+
+    async def _run(self) -> None:
+        resync = False
+        while True:
+            try:
+                if resync:
+                    await self._resync()
+                    resync = False
+                self.mode = "change_stream"
+                await self._tail_change_stream()
+            except OperationFailure as e:
+                # Standalone servers have no oplog to tail
+                if e.code in (40573, 40415) or "replica set" in str(e).lower():
+                    logger.info("Change streams unavailable, dashboard feed falling back to polling")
+                    self.mode = "polling"
+                    await self._poll()
+                    return
+                logger.error(f"Dashboard change stream failed: {str(e)}")
+                # Not resumable (e.g. ChangeStreamHistoryLost): the resume token is gone, so start over from a snapshot
+                if not e.has_error_label("ResumableChangeStreamError"):
+                    self._resume_token = None
+                    resync = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Dashboard change stream failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _resync(self) -> None:
+        """Reload the dashboard queries and send every client the fresh snapshot"""
+        await self.load_snapshot()
+        self._stats_dirty = False
+        self._broadcast({"type": "snapshot", **self.snapshot()})
+        logger.info("Dashboard feed resynced from a fresh snapshot")
+
+    async def _tail_change_stream(self) -> None:
+        # No updateLookup: inserts carry their document, and the only updates shown are status fields
+        status_updates = [
+            {"ns.coll": collection, "operationType": "update", "$or": [
+                {f"updateDescription.updatedFields.{field}": {"$exists": True}} for field in fields
+            ]}
+            for collection, fields in STATUS_FIELDS.items()
+        ]
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(WATCHED_COLLECTIONS)},
+            "$or": [{"operationType": {"$in": ["insert", "delete"]}}, *status_updates]
+        }}]
+        async with self.db.watch(pipeline, max_await_time_ms=int(self.stats_interval * 1000), resume_after=self._resume_token) as stream:
+            while stream.alive:
+                change = await stream.try_next()
+                self._resume_token = stream.resume_token
+                if change is not None:
+                    self._apply_change(change)
+                if self._stats_dirty and time.monotonic() - self._stats_sent_at >= self.stats_interval:
+                    self._send_stats()
+
+    def _apply_change(self, change: Dict[str, Any]) -> None:
+        operation, collection = change["operationType"], change["ns"]["coll"]
+        if operation == "insert" and collection in RECENT_ACTIVITY:
+            self._apply("insert", collection, change.get("fullDocument"))
+        elif operation == "update":
+            self._apply_status(collection, change["documentKey"]["_id"], change["updateDescription"]["updatedFields"])
+        else:
+            counter = WATCHED_COLLECTIONS[collection]
+            delta = 1 if operation == "insert" else -1
+            self.stats[counter] = max(0, self.stats.get(counter, 0) + delta)
+            self._stats_dirty = True
+
+    def _apply_status(self, collection: str, document_id: Any, updated: Dict[str, Any]) -> None:
+        """Patch a recent-activity entry whose displayed status changed"""
+        key = RECENT_ACTIVITY.get(collection)
+        ids = self._recent_ids.get(key, [])
+        if document_id not in ids:
+            return
+        document = self.recent[key][ids.index(document_id)]
+        document.update({field: updated[field] for field in STATUS_FIELDS[collection] if field in updated})
+        self._broadcast({"type": "update", "collection": collection, "document": document, "stats": dict(self.stats)})
+
+    def _send_stats(self) -> None:
+        self._stats_dirty = False
+        self._stats_sent_at = time.monotonic()
+        self._broadcast({"type": "stats", "stats": dict(self.stats)})
+
+    async def _poll(self) -> None:
+        """Fallback: fetch documents created after the last seen created_at, plus cheap count refreshes"""
+        while True:
+            try:
+                await self._poll_once()
+            except Exception as e:
+                logger.error(f"Dashboard polling failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll_once(self) -> None:
+        for collection in WATCHED_COLLECTIONS:
+            cursor = self.db[collection].find(
+                {"created_at": {"$gt": self._poll_marks.get(collection, datetime.min)}},
+                HIDDEN_FIELDS
+            ).sort("created_at", 1).limit(500)
+            async for document in cursor:
+                self._poll_marks[collection] = document["created_at"]
+                self._apply("insert", collection, document)
+
+            counter = WATCHED_COLLECTIONS[collection]
+            count = await self.db[collection].estimated_document_count()
+            if count != self.stats.get(counter):
+                self.stats[counter] = count
+                self._broadcast({"type": "stats", "stats": dict(self.stats)})
+
+
+def format_sse(message: Dict[str, Any]) -> str:
+    """Encode a feed message as a server-sent event"""
+    return f"event: {message['type']}\ndata: {json.dumps(message, default=json_default)}\n\n"
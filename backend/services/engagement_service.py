@@ -0,0 +1,199 @@
+import os
+import asyncio
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from models import PaymentStatus
+from services.convertkit_service import ConvertKitService
+import logging
+
+logger = logging.getLogger(__name__)
+
+# high_engagement tagging states stored on each lead
+QUEUED = "queued"
+TAGGED = "tagged"
+FAILED = "failed"
+
+# Share of the 0-100 score contributed by each signal
+WEIGHTS = {
+    "recency": 0.35,
+    "repeat": 0.20,
+    "source": 0.15,
+    "account": 0.10,
+    "purchase": 0.20
+}
+
+DEFAULT_SOURCE_WEIGHTS = {"pricing": 1.0, "checkout": 1.0, "prompts": 0.7, "homepage": 0.4, "import": 0.2}
+
+LEAD_FIELDS = {
+    "_id": 1, "email": 1, "created_at": 1, "last_seen_at": 1, "submission_count": 1,
+    "source_page": 1, "engagement_score": 1, "high_engagement_status": 1
+}
+
+
+def parse_source_weights(value: Optional[str]) -> Dict[str, float]:
+    """Parse "pricing=1.0,homepage=0.4" overrides on top of the defaults"""
+    weights = dict(DEFAULT_SOURCE_WEIGHTS)
+    for item in (value or "").split(","):
+        if "=" in item:
+            name, weight = item.split("=", 1)
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+class EngagementScoringService:
+    def __init__(self, database: AsyncIOMotorDatabase, convertkit_service: Optional[ConvertKitService] = None):
+        self.db = database
+        self.convertkit_service = convertkit_service
+        self.batch_size = int(os.getenv("ENGAGEMENT_BATCH_SIZE", "5000"))
+        self.threshold = float(os.getenv("ENGAGEMENT_TAG_THRESHOLD", "70"))
+        self.half_life_days = float(os.getenv("ENGAGEMENT_RECENCY_HALF_LIFE_DAYS", "14"))
+        self.default_source_weight = float(os.getenv("ENGAGEMENT_DEFAULT_SOURCE_WEIGHT", "0.5"))
+        self.source_weights = parse_source_weights(os.getenv("ENGAGEMENT_SOURCE_WEIGHTS"))
+        self.tag_concurrency = int(os.getenv("CONVERTKIT_ENROLL_CONCURRENCY", "10"))
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def ensure_indexes(self) -> None:
+        await self.db.lead_magnets.create_index("high_engagement_status", sparse=True)
+
+    async def run(self) -> Dict[str, Any]:
+        """Score every lead, then tag the ones that crossed the threshold; one run at a time per process"""
+        if self._running:
+            return {"success": False, "error": "Scoring already running"}
+        self._running = True
+        try:
+            summary = await self.score_leads()
+            summary["tagged"] = await self.tag_high_engagement()
+            return {"success": True, **summary}
+        except Exception as e:
+            logger.error(f"Lead scoring run failed: {str(e)}")
+            return {"success": False, "error": str(e)}
+        finally:
+            self._running = False
+
+    async def score_leads(self) -> Dict[str, Any]:
+        """Stream leads in cursor batches, score each batch with NumPy and write back changed scores"""
+        now = datetime.utcnow()
+        summary = {"scored": 0, "updated": 0, "queued": 0}
+        cursor = self.db.lead_magnets.find({}, LEAD_FIELDS).batch_size(self.batch_size)
+
+        batch: List[Dict[str, Any]] = []
+        async for lead in cursor:
+            batch.append(lead)
+            if len(batch) >= self.batch_size:
+                await self._score_batch(batch, now, summary)
+                batch = []
+        if batch:
+            await self._score_batch(batch, now, summary)
+
+        logger.info(f"Scored {summary['scored']} leads: {summary['updated']} updated, {summary['queued']} queued for high_engagement")
+        return summary
+
+    async def _score_batch(self, leads: List[Dict[str, Any]], now: datetime, summary: Dict[str, Any]) -> None:
+        emails = list({lead["email"] for lead in leads})
+        purchasers = set(await self.db.payment_transactions.distinct(
+            "email", {"email": {"$in": emails}, "payment_status": PaymentStatus.COMPLETED}
+        ))
+        account_holders = set(await self.db.users.distinct("email", {"email": {"$in": emails}}))
+
+        scores = self.compute_scores(leads, now, purchasers, account_holders)
+        previous = np.array([
+            lead["engagement_score"] if lead.get("engagement_score") is not None else -1.0 for lead in leads
+        ], dtype=np.float64)
+        untagged = np.array([lead.get("high_engagement_status") in (None, FAILED) for lead in leads])
+
+        crossed = (scores >= self.threshold) & untagged
+        changed = (np.abs(scores - previous) >= 0.01) | crossed
+
+        ops = []
+        for i in np.flatnonzero(changed):
+            update = {"engagement_score": float(scores[i]), "engagement_scored_at": now}
+            if crossed[i]:
+                update["high_engagement_status"] = QUEUED
+            ops.append(UpdateOne({"_id": leads[i]["_id"]}, {"$set": update}))
+        if ops:
+            await self.db.lead_magnets.bulk_write(ops, ordered=False)
+
+        summary["scored"] += len(leads)
+        summary["updated"] += len(ops)
+        summary["queued"] += int(crossed.sum())
+
+    def compute_scores(
+        self,
+        leads: List[Dict[str, Any]],
+        now: datetime,
+        purchasers: set,
+        account_holders: set
+    ) -> np.ndarray:
+        """Vectorized 0-100 engagement score for a batch of leads"""
+        seen = np.array(
+            [(lead.get("last_seen_at") or lead.get("created_at") or now).replace(tzinfo=None) for lead in leads],
+            dtype="datetime64[s]"
+        )
+        age_days = np.maximum((np.datetime64(now.replace(tzinfo=None), "s") - seen).astype(np.float64) / 86400.0, 0.0)
+        recency = np.power(0.5, age_days / self.half_life_days)
+
+        submissions = np.array([lead.get("submission_count") or 1 for lead in leads], dtype=np.float64)
+        repeat = np.minimum(np.log1p(submissions - 1) / np.log1p(4), 1.0)
+
+        source = np.array(
+            [self.source_weights.get(lead.get("source_page"), self.default_source_weight) for lead in leads],
+            dtype=np.float64
+        )
+        account = np.array([lead["email"] in account_holders for lead in leads], dtype=np.float64)
+        purchase = np.array([lead["email"] in purchasers for lead in leads], dtype=np.float64)
+
+        score = (
+            WEIGHTS["recency"] * recency
+            + WEIGHTS["repeat"] * repeat
+            + WEIGHTS["source"] * np.clip(source, 0.0, 1.0)
+            + WEIGHTS["account"] * account
+            + WEIGHTS["purchase"] * purchase
+        )
+        return np.round(score * 100, 2)
+
+    async def tag_high_engagement(self) -> int:
+        """Apply the ConvertKit high_engagement tag to queued leads with bounded concurrency"""
+        if not self.convertkit_service:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.tag_concurrency)
+        tagged = 0
+
+        async def tag_one(lead: Dict[str, Any]) -> None:
+            nonlocal tagged
+            async with semaphore:
+                try:
+                    result = await self.convertkit_service.add_tag_to_subscriber(lead["email"], "high_engagement")
+                except Exception as e:
+                    logger.error(f"high_engagement tagging failed for {lead['email']}: {str(e)}")
+                    result = {"success": False}
+                if result.get("success"):
+                    tagged += 1
+                    update = {"high_engagement_status": TAGGED, "high_engagement_tagged_at": datetime.utcnow()}
+                else:
+                    update = {"high_engagement_status": FAILED}
+                await self.db.lead_magnets.update_one({"_id": lead["_id"]}, {"$set": update})
+
+        cursor = self.db.lead_magnets.find(
+            {"high_engagement_status": QUEUED},
+            {"_id": 1, "email": 1}
+        ).batch_size(self.batch_size)
+
+        chunk: List[Dict[str, Any]] = []
+        async for lead in cursor:
+            chunk.append(lead)
+            if len(chunk) >= self.batch_size:
+                await asyncio.gather(*[tag_one(item) for item in chunk])
+                chunk = []
+        if chunk:
+            await asyncio.gather(*[tag_one(item) for item in chunk])
+
+        logger.info(f"Tagged {tagged} leads as high_engagement")
+        return tagged
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import asyncio
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple, Union
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from models import PaymentStatus
+from streaming import json_default
+from catalog_snapshot import CatalogSnapshotStore, snapshot_key
+from mongo_pool import stale_reads, max_staleness
+from compression import IDENTITY, precompress, weak_etag
+import logging
+
+logger = logging.getLogger(__name__)
+
+FREE = "free"
+PREMIUM = "premium"
+
+PREMIUM_ROLES = ("premium_customer", "admin")
+
+# Catalog imports bump this counter; each built catalog records the version it was built from
+CATALOG_META = "catalog_meta"
+CATALOG_META_ID = "prompts"
+CATALOG_VERSION_KEY = "catalog_version"
+
+
+async def stored_catalog_version(database: AsyncIOMotorDatabase) -> int:
+    meta = await database[CATALOG_META].find_one({"_id": CATALOG_META_ID}, {"version": 1})
+    return meta["version"] if meta else 0
+
+
+class EntitlementService:
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.db = database
+        # The catalog tolerates replication lag, except right after an invalidation (see _catalog_db)
+        self.catalog_db = stale_reads(database)
+        self._primary_reads_until = 0.0
+        # Premium never downgrades on its own, so it can be cached much longer than free
+        self.premium_ttl = float(os.getenv("ENTITLEMENT_PREMIUM_TTL", "3600"))
+        self.free_ttl = float(os.getenv("ENTITLEMENT_FREE_TTL", "60"))
+        self.catalog_ttl = float(os.getenv("PROMPT_CATALOG_TTL", "300"))
+        # How often to look for a catalog import by another worker or the CLI
+        self.version_check_interval = float(os.getenv("PROMPT_CATALOG_VERSION_CHECK_INTERVAL", "10"))
+        self._version_checked_at = 0.0
+        self.max_users = int(os.getenv("ENTITLEMENT_CACHE_SIZE", "50000"))
+
+        self._tiers: Dict[str, Tuple[str, float]] = {}
+        self._catalog: Dict[str, bytes] = {}
+        self._catalog_loaded_at = 0.0
+        self._catalog_lock = asyncio.Lock()
+        
+        # Cross-worker catalog in a memory-mapped file; None keeps the per-process cache above
+        self.snapshots = CatalogSnapshotStore.from_env()
+        self._stale_generation = 0
+
+    async def get_tier(self, user_id: Optional[str]) -> str:
+        """Resolve a user's access tier from role and purchases, cached per user"""
+        if not user_id:
+            return FREE
+
+        cached = self._tiers.get(user_id)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        tier = FREE
+        user = await self.db.users.find_one({"id": user_id}, {"_id": 0, "role": 1, "email": 1})
+        if user:
+            if user.get("role") in PREMIUM_ROLES:
+                tier = PREMIUM
+            else:
+                purchase = await self.db.payment_transactions.find_one(
+                    {
+                        "$or": [{"user_id": user_id}, {"email": user.get("email")}],
+                        "payment_status": PaymentStatus.COMPLETED
+                    },
+                    {"_id": 1}
+                )
+                if purchase:
+                    tier = PREMIUM
+
+        if len(self._tiers) >= self.max_users:
+            self._tiers.clear()
+        ttl = self.premium_ttl if tier == PREMIUM else self.free_ttl
+        self._tiers[user_id] = (tier, time.monotonic() + ttl)
+        return tier
+
+    def can_access(self, tier: str, prompt: Dict[str, Any]) -> bool:
+        return tier == PREMIUM or not prompt.get("is_premium")
+
+    def invalidate_user(self, user_id: Optional[str]) -> None:
+        """Drop a user's cached tier, e.g. after a purchase completes"""
+        if user_id:
+            self._tiers.pop(user_id, None)
+
+    def invalidate_catalog(self) -> None:
+        self._catalog = {}
+        self._catalog_loaded_at = 0.0
+        # A secondary may not have the change yet; rebuild from the primary until it must have
+        self._primary_reads_until = time.monotonic() + max_staleness()
+        if self.snapshots:
+            # Generations up to the current one are stale; the next read publishes a new one
+            current = self.snapshots.current(force=True)
+            self._stale_generation = current.generation if current else 0
+
+    async def get_catalog(
+        self,
+        tier: str,
+        category: Optional[str] = None,
+        encodings: Sequence[str] = (IDENTITY,)
+    ) -> Tuple[Union[bytes, memoryview], str, Optional[str]]:
+        """Pre-serialized {"prompts": [...]} JSON for a tier and optional category, as (body, coding, ETag)
+
+        encodings are the content codings the client accepts, best first; the first one
+        precompressed for this catalog version is returned, falling back to identity.
+        """
+        lookup = await self._catalog_lookup()
+        if await self._newer_version_imported(lookup):
+            self.invalidate_catalog()
+            lookup = await self._catalog_lookup()
+
+        key = snapshot_key(tier, category)
+        etag = lookup(f"{key}|etag")
+        for encoding in encodings:
+            body = lookup(key if encoding == IDENTITY else f"{key}|{encoding}")
+            if body is not None:
+                return body, encoding, bytes(etag).decode("ascii") if etag is not None else None
+        return json.dumps({"tier": tier, "prompts": []}).encode("utf-8"), IDENTITY, None
+
+    async def _catalog_lookup(self) -> Callable[[str], Optional[Union[bytes, memoryview]]]:
+        lookup = await self._snapshot_lookup() if self.snapshots else None
+        if lookup is None:
+            if time.monotonic() - self._catalog_loaded_at > self.catalog_ttl:
+                async with self._catalog_lock:
+                    if time.monotonic() - self._catalog_loaded_at > self.catalog_ttl:
+                        self._catalog = await self._build_bodies()
+                        self._catalog_loaded_at = time.monotonic()
+            lookup = self._catalog.get
+        return lookup
+
+    async def _newer_version_imported(self, lookup: Callable[[str], Optional[Union[bytes, memoryview]]]) -> bool:
+        """Whether the stored catalog version is ahead of the one being served (checked at most every interval)"""
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return False
+        self._version_checked_at = now
+        try:
+            if self.snapshots:
+                # Another worker may already have published the import; don't build it twice
+                current = self.snapshots.current(force=True)
+                lookup = current.get if current is not None else lookup
+            served = lookup(CATALOG_VERSION_KEY)
+            return await stored_catalog_version(self.db) > int(bytes(served) if served is not None else 0)
+        except Exception as e:
+            logger.warning(f"Catalog version check failed: {str(e)}")
+            return False
+
+    def _snapshot_stale(self, snapshot) -> bool:
+        return snapshot is None or snapshot.generation <= self._stale_generation or snapshot.age > self.catalog_ttl
+
+    async def _snapshot_lookup(self) -> Optional[Callable[[str], Optional[memoryview]]]:
+        """Read from the shared snapshot, publishing a new generation if this worker wins the build lock"""
+        snapshot = self.snapshots.current()
+        if self._snapshot_stale(snapshot):
+            async with self._catalog_lock:
+                snapshot = self.snapshots.current(force=True)
+                if self._snapshot_stale(snapshot):
+                    try:
+                        with self.snapshots.build_lock() as acquired:
+                            # Losing the lock means another worker is publishing; keep serving what we have
+                            if acquired:
+                                snapshot = self.snapshots.current(force=True)
+                                if self._snapshot_stale(snapshot):
+                                    bodies = await self._build_bodies()
+                                    snapshot = await asyncio.to_thread(self.snapshots.publish, bodies)
+                                    logger.info(f"Published prompt catalog generation {snapshot.generation}")
+                    except OSError as e:
+                        logger.error(f"Failed to publish catalog snapshot: {str(e)}")
+
+        return snapshot.get if snapshot is not None else None
+
+    async def _build_bodies(self) -> Dict[str, bytes]:
+        """Every catalog body with its ETag and precompressed codings, keyed for lookup"""
+        # Read before the prompts, so an import landing mid-build is picked up by the next check
+        version = await stored_catalog_version(self.db)
+        catalog = await self._build_catalog()
+        # Maximum-level compression is slow, but happens once per catalog version
+        bodies = await asyncio.to_thread(self._encode_bodies, catalog)
+        bodies[CATALOG_VERSION_KEY] = str(version).encode("ascii")
+        return bodies
+
+    def _encode_bodies(self, catalog: Dict[Tuple[str, Optional[str]], bytes]) -> Dict[str, bytes]:
+        bodies: Dict[str, bytes] = {}
+        for (tier, category), body in catalog.items():
+            key = snapshot_key(tier, category)
+            bodies[key] = body
+            bodies[f"{key}|etag"] = weak_etag(body).encode("ascii")
+            for encoding, compressed in precompress(body).items():
+                bodies[f"{key}|{encoding}"] = compressed
+        return bodies
+
+    async def _build_catalog(self) -> Dict[Tuple[str, Optional[str]], bytes]:
+        database = self.db if time.monotonic() < self._primary_reads_until else self.catalog_db
+        prompts = await database.prompts.find({}, {"_id": 0}).sort("created_at", 1).to_list(length=None)
+
+        catalog: Dict[Tuple[str, Optional[str]], bytes] = {}
+        for tier in (FREE, PREMIUM):
+            visible = [self._present(tier, prompt) for prompt in prompts]
+            categories = {prompt.get("category") for prompt in visible}
+            catalog[(tier, None)] = self._serialize(tier, visible)
+            for category in categories:
+                catalog[(tier, category)] = self._serialize(tier, [p for p in visible if p.get("category") == category])
+
+        logger.info(f"Built prompt catalog for {len(prompts)} prompts")
+        return catalog
+
+    def _present(self, tier: str, prompt: Dict[str, Any]) -> Dict[str, Any]:
+        """Premium prompts stay listed for free users, but without their content"""
+        if self.can_access(tier, prompt):
+            return {**prompt, "locked": False}
+        return {**prompt, "content": None, "locked": True}
+
+    def _serialize(self, tier: str, prompts: List[Dict[str, Any]]) -> bytes:
+        return json.dumps({"tier": tier, "prompts": prompts}, default=json_default).encode("utf-8")
@@ -0,0 +1,82 @@
+import os
+from typing import Dict, Any, List, Optional, AsyncIterator
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from services.retention_service import archive_collection
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExportService:
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.db = database
+        self.batch_size = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+        # Exportable datasets: source collection and the fields callers may select
+        self.exports = {
+            "leads": {
+                "collection": "lead_magnets",
+                "fields": [
+                    "id", "email", "name", "magnet_type", "source_page", "created_at",
+                    "last_seen_at", "submission_count", "convertkit_status", "convertkit_subscriber_id"
+                ]
+            },
+            "transactions": {
+                "collection": "payment_transactions",
+                "fields": [
+                    "id", "session_id", "user_id", "email", "amount", "currency", "product_name",
+                    "payment_status", "stripe_payment_intent_id", "created_at", "completed_at", "metadata"
+                ]
+            }
+        }
+
+        # Archived data moved out of the hot collections by RetentionService
+        for dataset in list(self.exports):
+            self.exports[f"{dataset}_archive"] = {
+                "collection": archive_collection(self.exports[dataset]["collection"]),
+                "fields": self.exports[dataset]["fields"] + ["archived_at"]
+            }
+
+    async def ensure_indexes(self) -> None:
+        """Index created_at so date-range exports walk an index instead of scanning"""
+        for export in self.exports.values():
+            await self.db[export["collection"]].create_index("created_at")
+
+    def resolve_fields(self, dataset: str, fields: Optional[str]) -> List[str]:
+        """Validate a comma-separated field selection against the dataset's allowed fields"""
+        allowed = self.exports[dataset]["fields"]
+        if not fields:
+            return allowed
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown fields for {dataset}: {', '.join(unknown)}")
+        return selected
+
+    def build_query(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+        created_at: Dict[str, Any] = {}
+        if start:
+            created_at["$gte"] = start
+        if end:
+            created_at["$lt"] = end
+        return {"created_at": created_at} if created_at else {}
+
+    async def iter_documents(
+        self,
+        dataset: str,
+        fields: List[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream matching documents from a cursor, batch_size documents per round trip"""
+        collection = self.db[self.exports[dataset]["collection"]]
+        projection = {field: 1 for field in fields}
+        projection["_id"] = 0
+
+        cursor = collection.find(self.build_query(start, end), projection).sort("created_at", 1).batch_size(self.batch_size)
+        count = 0
+        async for doc in cursor:
+            count += 1
+            yield doc
+        logger.info(f"Exported {count} {dataset} documents")
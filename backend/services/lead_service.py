@@ -0,0 +1,289 @@
+import os
+import uuid
+import asyncio
+from typing import Dict, Any, Optional, Tuple, List, AsyncIterator
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure, BulkWriteError
+from models import LeadMagnetSignup, SubscribeRequest
+from services.convertkit_service import ConvertKitService
+from services.analytics_service import AnalyticsService
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ConvertKit enrollment states stored on each lead
+ENROLLING = "enrolling"
+ENROLLED = "enrolled"
+FAILED = "failed"
+PENDING = "pending"
+IMPORTED = "imported"  # bulk-imported with enrollment disabled; managed outside ConvertKit sync
+
+# Row errors echoed back to the caller of a bulk import
+MAX_REPORTED_ERRORS = 100
+
+
+class LeadCaptureService:
+    def __init__(
+        self,
+        database: AsyncIOMotorDatabase,
+        convertkit_service: Optional[ConvertKitService] = None,
+        analytics_service: Optional[AnalyticsService] = None
+    ):
+        self.db = database
+        self.convertkit_service = convertkit_service
+        self.analytics_service = analytics_service
+        self.import_batch_size = int(os.getenv("LEAD_IMPORT_BATCH_SIZE", "1000"))
+        self.enroll_concurrency = int(os.getenv("CONVERTKIT_ENROLL_CONCURRENCY", "10"))
+
+    async def ensure_indexes(self) -> None:
+        """Create the unique (email, magnet_type) index, merging legacy duplicates first if needed"""
+        try:
+            await self._create_unique_index()
+        except (DuplicateKeyError, OperationFailure) as e:
+            logger.warning(f"Unique lead index blocked by duplicates, merging: {str(e)}")
+            merged = await self.merge_duplicates()
+            logger.info(f"Merged {merged} duplicate lead documents")
+            await self._create_unique_index()
+
+    async def lowercase_legacy_emails(self, database: AsyncIOMotorDatabase) -> Dict[str, int]:
+        """One-off migration (see seed.run_once): new signups are keyed by lowercase email, legacy leads may not be"""
+        merged = await self.merge_duplicates()
+        logger.info(f"Lowercased legacy lead emails, merging {merged} duplicate lead documents")
+        return {"merged": merged}
+
+    async def _create_unique_index(self) -> None:
+        await self.db.lead_magnets.create_index(
+            [("email", 1), ("magnet_type", 1)],
+            unique=True,
+            name="email_magnet_type_unique"
+        )
+
+    async def merge_duplicates(self) -> int:
+        """Collapse repeat signups into the earliest document per (lowercased email, magnet_type)"""
+        pipeline = [
+            {"$sort": {"created_at": 1}},
+            {"$group": {
+                "_id": {"email": {"$toLower": "$email"}, "magnet_type": "$magnet_type"},
+                "keep": {"$first": "$_id"},
+                "keep_email": {"$first": "$email"},
+                "ids": {"$push": "$_id"},
+                "count": {"$sum": {"$ifNull": ["$submission_count", 1]}},
+                "last_seen_at": {"$max": {"$ifNull": ["$last_seen_at", "$created_at"]}}
+            }},
+            # Duplicates, or a single legacy document whose email isn't lowercase yet
+            {"$match": {"$expr": {"$or": [
+                {"$gt": [{"$size": "$ids"}, 1]},
+                {"$ne": ["$keep_email", "$_id.email"]}
+            ]}}}
+        ]
+
+        removed = 0
+        async for group in self.db.lead_magnets.aggregate(pipeline, allowDiskUse=True):
+            # Delete first: the kept document takes the lowercase key a duplicate may hold
+            duplicates = [doc_id for doc_id in group["ids"] if doc_id != group["keep"]]
+            if duplicates:
+                result = await self.db.lead_magnets.delete_many({"_id": {"$in": duplicates}})
+                removed += result.deleted_count
+            await self.db.lead_magnets.update_one(
+                {"_id": group["keep"]},
+                {"$set": {
+                    "email": group["_id"]["email"],
+                    "submission_count": group["count"],
+                    "last_seen_at": group["last_seen_at"]
+                }}
+            )
+        return removed
+
+    async def capture(self, request: SubscribeRequest) -> Tuple[Dict[str, Any], bool]:
+        """Upsert the lead and return it with whether ConvertKit enrollment should run now"""
+        key, update = self._lead_upsert(
+            request,
+            datetime.utcnow(),
+            ENROLLING if self.convertkit_service else PENDING
+        )
+        try:
+            doc = await self._upsert(key, update)
+        except DuplicateKeyError:
+            # Lost an insert race with a concurrent submission; the document exists now
+            doc = await self._upsert(key, update)
+
+        # Only the upsert that inserted the lead sees its own generated id; legacy leads
+        # without a submission_count would otherwise look new on their next submission
+        if doc["id"] == update["$setOnInsert"]["id"]:
+            if self.analytics_service:
+                await self.analytics_service.record_signups([doc], doc["created_at"])
+            return doc, self.convertkit_service is not None
+
+        if doc.get("convertkit_status") in (FAILED, PENDING) and self.convertkit_service:
+            claimed = await self.db.lead_magnets.update_one(
+                {"id": doc["id"], "convertkit_status": doc["convertkit_status"]},
+                {"$set": {"convertkit_status": ENROLLING}}
+            )
+            return doc, claimed.modified_count == 1
+
+        return doc, False
+
+    def _lead_upsert(
+        self,
+        request: SubscribeRequest,
+        now: datetime,
+        convertkit_status: str,
+        extra_on_insert: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Build the (filter, update) pair shared by single and bulk lead capture"""
+        lead = LeadMagnetSignup(
+            email=request.email.lower(),
+            name=request.first_name,
+            magnet_type=request.magnet_type,
+            source_page=request.source_page,
+            created_at=now
+        )
+
+        on_insert = lead.dict(exclude={"last_seen_at", "submission_count", "name"})
+        on_insert["convertkit_status"] = convertkit_status
+        on_insert.update(extra_on_insert or {})
+
+        update = {
+            "$setOnInsert": on_insert,
+            "$set": {"last_seen_at": now},
+            "$inc": {"submission_count": 1}
+        }
+        if lead.name:
+            update["$set"]["name"] = lead.name
+        else:
+            update["$setOnInsert"]["name"] = None
+
+        return {"email": lead.email, "magnet_type": lead.magnet_type}, update
+
+    async def _upsert(self, key: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.db.lead_magnets.find_one_and_update(
+            key,
+            update,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"_id": 0}
+        )
+
+    async def enroll(self, lead_id: str, email: str, first_name: Optional[str], magnet_type: str) -> Dict[str, Any]:
+        """Run ConvertKit lead magnet enrollment and record the outcome on the lead"""
+        result = await self.convertkit_service.process_lead_magnet_signup(email, first_name, magnet_type)
+
+        if result.get("success"):
+            update = {
+                "convertkit_status": ENROLLED,
+                "convertkit_subscriber_id": result.get("subscriber_id"),
+                "convertkit_enrolled_at": datetime.utcnow()
+            }
+        else:
+            update = {"convertkit_status": FAILED}
+
+        await self.db.lead_magnets.update_one({"id": lead_id}, {"$set": update})
+        return result
+
+    async def import_records(
+        self,
+        records: AsyncIterator[Dict[str, Any]],
+        magnet_type: Optional[str] = None,
+        source_page: Optional[str] = "import",
+        enroll: bool = True
+    ) -> Dict[str, Any]:
+        """Validate streamed rows and upsert them in unordered bulk_write batches"""
+        import_id = str(uuid.uuid4())
+        if not enroll:
+            status = IMPORTED
+        else:
+            status = ENROLLING if self.convertkit_service else PENDING
+        summary = {"import_id": import_id, "rows": 0, "inserted": 0, "updated": 0, "invalid": 0, "errors": []}
+        batch: List[UpdateOne] = []
+        batch_leads: List[Dict[str, Any]] = []
+        now = datetime.utcnow()
+
+        async for record in records:
+            summary["rows"] += 1
+            try:
+                if "__error__" in record:
+                    raise ValueError(record["__error__"])
+                request = SubscribeRequest(
+                    email=record.get("email"),
+                    first_name=record.get("first_name"),
+                    magnet_type=record.get("magnet_type") or magnet_type,
+                    source_page=record.get("source_page") or source_page
+                )
+            except (ValidationError, ValueError) as e:
+                summary["invalid"] += 1
+                if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                    message = e.errors()[0]["msg"] if isinstance(e, ValidationError) else str(e)
+                    summary["errors"].append({"row": summary["rows"], "error": message})
+                continue
+
+            key, update = self._lead_upsert(request, now, status, {"import_id": import_id})
+            batch.append(UpdateOne(key, update, upsert=True))
+            batch_leads.append(update["$setOnInsert"])
+            if len(batch) >= self.import_batch_size:
+                await self._flush_import_batch(batch, batch_leads, summary)
+                batch, batch_leads = [], []
+
+        if batch:
+            await self._flush_import_batch(batch, batch_leads, summary)
+
+        summary["enrollment_queued"] = status == ENROLLING and summary["inserted"] > 0
+        logger.info(f"Lead import {import_id}: {summary['inserted']} new, {summary['updated']} existing, {summary['invalid']} invalid")
+        return summary
+
+    async def _flush_import_batch(
+        self,
+        batch: List[UpdateOne],
+        leads: List[Dict[str, Any]],
+        summary: Dict[str, Any],
+        retry: bool = True
+    ) -> None:
+        try:
+            result = await self.db.lead_magnets.bulk_write(batch, ordered=False)
+            summary["inserted"] += result.upserted_count
+            summary["updated"] += result.matched_count
+            inserted = list(result.upserted_ids)
+        except BulkWriteError as e:
+            details = e.details
+            summary["inserted"] += details.get("nUpserted", 0)
+            summary["updated"] += details.get("nMatched", 0)
+            inserted = [item["index"] for item in details.get("upserted", [])]
+
+            # Duplicate key errors mean a concurrent writer inserted the lead first; replaying matches it
+            raced = [error["index"] for error in details.get("writeErrors", []) if error.get("code") == 11000]
+            if raced and retry:
+                await self._flush_import_batch([batch[i] for i in raced], [leads[i] for i in raced], summary, retry=False)
+            failed = len(details.get("writeErrors", [])) - (len(raced) if retry else 0)
+            if failed:
+                logger.error(f"Lead import batch had {failed} write errors")
+                summary["invalid"] += failed
+
+        if self.analytics_service and inserted:
+            await self.analytics_service.record_signups([leads[i] for i in inserted])
+
+    async def enroll_import(self, import_id: str) -> None:
+        """Enroll an import's new leads in ConvertKit, chunk by chunk with bounded concurrency"""
+        semaphore = asyncio.Semaphore(self.enroll_concurrency)
+
+        async def enroll_one(lead: Dict[str, Any]) -> None:
+            async with semaphore:
+                try:
+                    await self.enroll(lead["id"], lead["email"], lead.get("name"), lead.get("magnet_type") or "general")
+                except Exception as e:
+                    logger.error(f"Enrollment failed for imported lead {lead['id']}: {str(e)}")
+
+        cursor = self.db.lead_magnets.find(
+            {"import_id": import_id, "convertkit_status": ENROLLING},
+            {"_id": 0, "id": 1, "email": 1, "name": 1, "magnet_type": 1}
+        ).batch_size(self.import_batch_size)
+
+        chunk: List[Dict[str, Any]] = []
+        async for lead in cursor:
+            chunk.append(lead)
+            if len(chunk) >= self.import_batch_size:
+                await asyncio.gather(*[enroll_one(item) for item in chunk])
+                chunk = []
+        if chunk:
+            await asyncio.gather(*[enroll_one(item) for item in chunk])
@@ -0,0 +1,104 @@
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from services.entitlement_service import PREMIUM
+import logging
+
+logger = logging.getLogger(__name__)
+
+# [PRODUCT/SERVICE], [TARGET AUDIENCE], [BUSINESS TYPE] ...
+PLACEHOLDER_PATTERN = re.compile(r"\[([A-Z0-9][A-Z0-9 /&_\-']*)\]")
+
+
+def normalize_variable(name: str) -> str:
+    return " ".join(name.strip().upper().split())
+
+
+class TemplateVariablesError(ValueError):
+    def __init__(self, missing: List[str]):
+        self.missing = missing
+        super().__init__(f"Missing template variables: {', '.join(missing)}")
+
+
+class CompiledTemplate:
+    """Prompt content split once into literal text and variable slots"""
+
+    def __init__(self, content: str):
+        self.segments: List[Tuple[bool, str]] = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(content):
+            if match.start() > position:
+                self.segments.append((False, content[position:match.start()]))
+            self.segments.append((True, normalize_variable(match.group(1))))
+            position = match.end()
+        if position < len(content):
+            self.segments.append((False, content[position:]))
+
+        self.variables: List[str] = list(dict.fromkeys(value for is_variable, value in self.segments if is_variable))
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        values = {normalize_variable(name): str(value) for name, value in variables.items()}
+        missing = [name for name in self.variables if not values.get(name)]
+        if missing:
+            raise TemplateVariablesError(missing)
+        return "".join(values[value] if is_variable else value for is_variable, value in self.segments)
+
+
+class PromptRenderService:
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.db = database
+        self.cache_size = int(os.getenv("PROMPT_TEMPLATE_CACHE_SIZE", "1024"))
+        self.max_batch = int(os.getenv("PROMPT_RENDER_MAX_BATCH", "500"))
+        self._templates: "OrderedDict[Tuple[str, Any], CompiledTemplate]" = OrderedDict()
+
+    async def get_template(self, prompt_id: str, tier: Optional[str] = None) -> Tuple[Dict[str, Any], CompiledTemplate]:
+        """Load a prompt and its compiled template, compiling at most once per (id, version)"""
+        prompt = await self.db.prompts.find_one(
+            {"id": prompt_id},
+            {"_id": 0, "id": 1, "title": 1, "content": 1, "version": 1, "is_premium": 1}
+        )
+        if not prompt:
+            raise KeyError(prompt_id)
+        if tier is not None and prompt.get("is_premium") and tier != PREMIUM:
+            raise PermissionError(prompt_id)
+
+        key = (prompt_id, prompt.get("version", 1))
+        template = self._templates.get(key)
+        if template is None:
+            template = CompiledTemplate(prompt["content"])
+            self._templates[key] = template
+            if len(self._templates) > self.cache_size:
+                self._templates.popitem(last=False)
+        else:
+            self._templates.move_to_end(key)
+        return prompt, template
+
+    async def render(self, prompt_id: str, variables: Dict[str, Any], tier: Optional[str] = None) -> Dict[str, Any]:
+        prompt, template = await self.get_template(prompt_id, tier)
+        return {
+            "prompt_id": prompt_id,
+            "version": prompt.get("version", 1),
+            "rendered": template.render(variables)
+        }
+
+    async def render_batch(self, prompt_id: str, variable_sets: List[Dict[str, Any]], tier: Optional[str] = None) -> Dict[str, Any]:
+        """Render one prompt against many variable sets; failures are reported per item"""
+        if len(variable_sets) > self.max_batch:
+            raise ValueError(f"At most {self.max_batch} variable sets per request")
+
+        prompt, template = await self.get_template(prompt_id, tier)
+        results = []
+        for variables in variable_sets:
+            try:
+                results.append({"rendered": template.render(variables)})
+            except TemplateVariablesError as e:
+                results.append({"error": str(e), "missing": e.missing})
+
+        return {
+            "prompt_id": prompt_id,
+            "version": prompt.get("version", 1),
+            "variables": template.variables,
+            "results": results
+        }
@@ -0,0 +1,157 @@
+import os
+import socket
+import asyncio
+from typing import Dict, Any
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReplaceOne
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+from models import PaymentStatus
+from services.lead_service import ENROLLING
+from services.engagement_service import QUEUED
+import logging
+
+logger = logging.getLogger(__name__)
+
+LEASE_ID = "retention"
+
+
+def archive_collection(collection: str) -> str:
+    return f"{collection}_archive"
+
+
+class RetentionService:
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.db = database
+        self.batch_size = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+        # Pause between batches so archival doesn't crowd out request traffic
+        self.batch_pause = float(os.getenv("RETENTION_BATCH_PAUSE", "0.1"))
+        self.compressor = os.getenv("RETENTION_ARCHIVE_COMPRESSOR", "zstd")
+        self.lease_seconds = float(os.getenv("RETENTION_LEASE_SECONDS", "3600"))
+        self.last_run: Dict[str, Any] = {}
+        self._running = False
+
+        # Archivable datasets: hot collection, age limit and what makes a document cold
+        self.policies = {
+            "leads": {
+                "collection": "lead_magnets",
+                "days": float(os.getenv("RETENTION_LEAD_DAYS", "365"))
+            },
+            "transactions": {
+                "collection": "payment_transactions",
+                "days": float(os.getenv("RETENTION_PENDING_TRANSACTION_DAYS", "7"))
+            }
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def ensure_indexes(self) -> None:
+        await self.db.payment_transactions.create_index([("payment_status", 1), ("created_at", 1)])
+        for policy in self.policies.values():
+            archive = archive_collection(policy["collection"])
+            try:
+                # Archives are written once and rarely read, so favour compression ratio over speed
+                await self.db.create_collection(
+                    archive,
+                    storageEngine={"wiredTiger": {"configString": f"block_compressor={self.compressor}"}}
+                )
+            except CollectionInvalid:
+                pass
+            await self.db[archive].create_index("created_at")
+
+    def cold_query(self, dataset: str, now: datetime) -> Dict[str, Any]:
+        cutoff = now - timedelta(days=self.policies[dataset]["days"])
+        if dataset == "leads":
+            # Inactive since the cutoff, and not in the middle of a ConvertKit enrollment or tagging
+            return {
+                "$or": [
+                    {"last_seen_at": {"$lt": cutoff}},
+                    {"last_seen_at": None, "created_at": {"$lt": cutoff}}
+                ],
+                "convertkit_status": {"$ne": ENROLLING},
+                "high_engagement_status": {"$ne": QUEUED}
+            }
+        # Checkout sessions expire after 24 hours, so an old pending transaction can never complete
+        return {"payment_status": PaymentStatus.PENDING.value, "created_at": {"$lt": cutoff}}
+
+    async def preview(self) -> Dict[str, int]:
+        """How many documents each policy would archive right now"""
+        now = datetime.utcnow()
+        return {
+            dataset: await self.db[policy["collection"]].count_documents(self.cold_query(dataset, now))
+            for dataset, policy in self.policies.items()
+        }
+
+    async def run(self) -> Dict[str, Any]:
+        """Archive every dataset; one run at a time across all workers"""
+        if self._running:
+            return {"success": False, "error": "Retention already running"}
+        self._running = True
+        try:
+            if not await self._acquire_lease():
+                return {"success": False, "error": "Retention running on another worker"}
+            try:
+                started = datetime.utcnow()
+                summary = {dataset: await self.archive(dataset, started) for dataset in self.policies}
+                self.last_run = {"started_at": started, "finished_at": datetime.utcnow(), "archived": summary}
+                logger.info(f"Retention run archived {summary}")
+                return {"success": True, "archived": summary}
+            finally:
+                await self._release_lease()
+        except Exception as e:
+            logger.error(f"Retention run failed: {str(e)}")
+            return {"success": False, "error": str(e)}
+        finally:
+            self._running = False
+
+    async def archive(self, dataset: str, now: datetime) -> int:
+        """Move cold documents to the archive in batches: copy first, then delete what is still cold"""
+        hot = self.db[self.policies[dataset]["collection"]]
+        archive = self.db[archive_collection(hot.name)]
+        query = self.cold_query(dataset, now)
+        archived = 0
+
+        while True:
+            docs = await hot.find(query).sort("created_at", 1).limit(self.batch_size).to_list(length=self.batch_size)
+            if not docs:
+                break
+            archived_at = datetime.utcnow()
+            for doc in docs:
+                doc["archived_at"] = archived_at
+            ids = [doc["_id"] for doc in docs]
+
+            # Upserts by _id make a retried batch (e.g. after a crash before the delete) idempotent
+            await archive.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+
+            # Re-checking the policy keeps documents that became active since they were read
+            result = await hot.delete_many({"_id": {"$in": ids}, **query})
+            archived += result.deleted_count
+            if result.deleted_count < len(ids):
+                still_hot = await hot.distinct("_id", {"_id": {"$in": ids}})
+                await archive.delete_many({"_id": {"$in": still_hot}})
+
+            if len(docs) < self.batch_size:
+                break
+            await asyncio.sleep(self.batch_pause)
+
+        return archived
+
+    async def _acquire_lease(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.db.maintenance_leases.update_one(
+                {"_id": LEASE_ID, "lease_until": {"$lt": now}},
+                {"$set": {
+                    "owner": f"{socket.gethostname()}:{os.getpid()}",
+                    "lease_until": now + timedelta(seconds=self.lease_seconds)
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def _release_lease(self) -> None:
+        await self.db.maintenance_leases.update_one({"_id": LEASE_ID}, {"$set": {"lease_until": datetime.utcnow()}})
@@ -0,0 +1,248 @@
+import os
+import re
+import copy
+import time
+import asyncio
+import contextvars
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "include",
+    "into", "is", "it", "of", "on", "or", "that", "the", "this", "to", "with", "your", "you"
+}
+
+# Repeat counts applied to each field's tokens before TF-IDF
+FIELD_WEIGHTS = {"title": 2, "tags": 3, "category": 1, "content": 1}
+
+CATALOG_FIELDS = {"_id": 0, "id": 1, "title": 1, "content": 1, "tags": 1, "category": 1, "is_premium": 1, "version": 1}
+
+
+class IndexUnavailableError(RuntimeError):
+    """The similarity index hasn't been built yet (e.g. the first build failed)"""
+
+
+def tokenize(prompt: Dict[str, Any]) -> Counter:
+    counts: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        value = prompt.get(field) or ""
+        text = " ".join(value) if isinstance(value, list) else str(value)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            if token not in STOPWORDS and len(token) > 1:
+                counts[token] += weight
+    return counts
+
+
+class SimilarityIndex:
+    """TF-IDF vectors and top-k cosine neighbours for a fixed vocabulary"""
+
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.active = np.zeros(0, dtype=bool)
+        self.neighbors: Dict[str, List[Tuple[str, float]]] = {}
+        self.summaries: Dict[str, Dict[str, Any]] = {}
+        self.versions: Dict[str, Any] = {}
+        self.stale_updates = 0
+
+    def build(self, prompts: List[Dict[str, Any]]) -> None:
+        """Full rebuild: new vocabulary, IDF weights, vectors and neighbour lists"""
+        token_counts = [tokenize(prompt) for prompt in prompts]
+        document_frequency: Counter = Counter()
+        for counts in token_counts:
+            document_frequency.update(counts.keys())
+
+        self.vocabulary = {token: i for i, token in enumerate(sorted(document_frequency))}
+        n_docs = max(len(prompts), 1)
+        self.idf = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token, i in self.vocabulary.items():
+            self.idf[i] = np.log((1 + n_docs) / (1 + document_frequency[token])) + 1
+
+        self.ids = [prompt["id"] for prompt in prompts]
+        self.positions = {prompt_id: i for i, prompt_id in enumerate(self.ids)}
+        self.matrix = np.vstack([self._vector(counts) for counts in token_counts]) if prompts else np.zeros((0, len(self.vocabulary)), dtype=np.float32)
+        self.active = np.ones(len(prompts), dtype=bool)
+        self.summaries = {prompt["id"]: self._summary(prompt) for prompt in prompts}
+        self.versions = {prompt["id"]: prompt.get("version", 1) for prompt in prompts}
+        self.stale_updates = 0
+
+        similarities = self.matrix @ self.matrix.T
+        self.neighbors = {prompt_id: self._top_k(similarities[i], i) for i, prompt_id in enumerate(self.ids)}
+
+    def copy(self) -> "SimilarityIndex":
+        """Independent copy to update off to the side while readers keep using this one"""
+        clone = copy.copy(self)
+        clone.ids = list(self.ids)
+        clone.positions = dict(self.positions)
+        clone.matrix = self.matrix.copy()
+        clone.active = self.active.copy()
+        # Neighbour lists are replaced, never mutated, so the lists themselves can be shared
+        clone.neighbors = dict(self.neighbors)
+        clone.summaries = dict(self.summaries)
+        clone.versions = dict(self.versions)
+        return clone
+
+    def update(self, changed: List[Dict[str, Any]], removed: List[str]) -> None:
+        """Incremental refresh: re-vectorize changed prompts and repair only affected neighbour lists"""
+        for prompt_id in removed:
+            position = self.positions.get(prompt_id)
+            if position is not None:
+                self.matrix[position] = 0
+                self.active[position] = False
+            self.summaries.pop(prompt_id, None)
+            self.versions.pop(prompt_id, None)
+            self.neighbors.pop(prompt_id, None)
+
+        changed_positions = []
+        for prompt in changed:
+            vector = self._vector(tokenize(prompt))
+            position = self.positions.get(prompt["id"])
+            if position is None:
+                position = len(self.ids)
+                self.ids.append(prompt["id"])
+                self.positions[prompt["id"]] = position
+                self.matrix = np.vstack([self.matrix, vector[np.newaxis, :]])
+                self.active = np.append(self.active, True)
+            else:
+                self.matrix[position] = vector
+                self.active[position] = True
+            self.summaries[prompt["id"]] = self._summary(prompt)
+            self.versions[prompt["id"]] = prompt.get("version", 1)
+            changed_positions.append(position)
+
+        touched = {prompt["id"] for prompt in changed} | set(removed)
+        if changed_positions:
+            changed_similarities = self.matrix[changed_positions] @ self.matrix.T
+            for row, position in enumerate(changed_positions):
+                self.neighbors[self.ids[position]] = self._top_k(changed_similarities[row], position)
+        else:
+            changed_similarities = np.zeros((0, len(self.ids)), dtype=np.float32)
+
+        # Other prompts only need work if they pointed at a touched prompt or a changed one now ranks higher
+        for prompt_id, neighbors in list(self.neighbors.items()):
+            if prompt_id in touched:
+                continue
+            position = self.positions[prompt_id]
+            if any(neighbor_id in touched for neighbor_id, _ in neighbors):
+                self.neighbors[prompt_id] = self._top_k(self.matrix @ self.matrix[position], position)
+                continue
+            floor = neighbors[-1][1] if len(neighbors) >= self.top_k else 0.0
+            for row, changed_position in enumerate(changed_positions):
+                score = float(changed_similarities[row, position])
+                if changed_position != position and score > floor:
+                    self.neighbors[prompt_id] = self._top_k(self.matrix @ self.matrix[position], position)
+                    break
+
+        self.stale_updates += len(changed) + len(removed)
+
+    def related(self, prompt_id: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        neighbors = self.neighbors.get(prompt_id)
+        if neighbors is None:
+            return None
+        return [{**self.summaries[neighbor_id], "score": round(score, 4)} for neighbor_id, score in neighbors[:limit]]
+
+    def _vector(self, counts: Counter) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token, count in counts.items():
+            index = self.vocabulary.get(token)
+            if index is not None:
+                vector[index] = (1 + np.log(count)) * self.idf[index]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _top_k(self, scores: np.ndarray, own_position: int) -> List[Tuple[str, float]]:
+        scores = np.where(self.active, scores, -1)
+        scores[own_position] = -1
+        k = min(self.top_k, len(scores) - 1)
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(self.ids[i], float(scores[i])) for i in ranked if scores[i] > 0]
+
+    def _summary(self, prompt: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": prompt["id"],
+            "title": prompt.get("title"),
+            "category": prompt.get("category"),
+            "tags": prompt.get("tags", []),
+            "is_premium": prompt.get("is_premium", False)
+        }
+
+
+class SimilarityService:
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.db = database
+        self.top_k = int(os.getenv("SIMILARITY_TOP_K", "10"))
+        self.refresh_interval = float(os.getenv("SIMILARITY_REFRESH_INTERVAL", "300"))
+        # Beyond this share of changed prompts, IDF drift warrants a full rebuild
+        self.full_rebuild_ratio = float(os.getenv("SIMILARITY_FULL_REBUILD_RATIO", "0.2"))
+        # How soon requests retry building an index that failed to build at startup
+        self.retry_interval = float(os.getenv("SIMILARITY_RETRY_INTERVAL", "30"))
+
+        self.index: Optional[SimilarityIndex] = None
+        # Startup builds the index (see the server lifespan), so requests don't start another build meanwhile
+        self._checked_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def related(self, prompt_id: str, limit: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Precomputed neighbours; refreshes run in the background and never inside the request"""
+        interval = self.refresh_interval if self.index is not None else self.retry_interval
+        if time.monotonic() - self._checked_at > interval and not self._refresh_in_progress():
+            # Not tied to this request, so it runs without the request's deadline
+            self._refresh_task = asyncio.create_task(self.refresh(), context=contextvars.Context())
+        index = self.index
+        if index is None:
+            raise IndexUnavailableError("Similarity index unavailable")
+        return index.related(prompt_id, max(1, min(limit, self.top_k)))
+
+    def _refresh_in_progress(self) -> bool:
+        return self._refresh_task is not None and not self._refresh_task.done()
+
+    async def refresh(self) -> None:
+        """Diff the catalog against the index by (id, version) and rebuild only what changed"""
+        async with self._lock:
+            try:
+                prompts = await self.db.prompts.find({}, CATALOG_FIELDS).to_list(length=None)
+                current = {prompt["id"]: prompt for prompt in prompts}
+
+                if self.index is None:
+                    index = SimilarityIndex(self.top_k)
+                    await asyncio.to_thread(index.build, prompts)
+                    self.index = index
+                    logger.info(f"Built similarity index for {len(prompts)} prompts")
+                    return
+
+                changed = [p for p in prompts if self.index.versions.get(p["id"]) != p.get("version", 1)]
+                removed = [prompt_id for prompt_id in self.index.versions if prompt_id not in current]
+                if not changed and not removed:
+                    return
+
+                pending = self.index.stale_updates + len(changed) + len(removed)
+                if pending > self.full_rebuild_ratio * max(len(prompts), 1):
+                    index = SimilarityIndex(self.top_k)
+                    await asyncio.to_thread(index.build, prompts)
+                    self.index = index
+                    logger.info(f"Rebuilt similarity index for {len(prompts)} prompts")
+                else:
+                    # related() reads the live index on the event loop; swap in an updated copy
+                    index = self.index.copy()
+                    await asyncio.to_thread(index.update, changed, removed)
+                    self.index = index
+                    logger.info(f"Updated similarity index: {len(changed)} changed, {len(removed)} removed")
+            except Exception as e:
+                logger.error(f"Similarity index refresh failed: {str(e)}")
+            finally:
+                self._checked_at = time.monotonic()
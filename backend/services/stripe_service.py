@@ -1,23 +1,36 @@
 import os
-from typing import Dict, Any, Optional
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+import asyncio
+from typing import Dict, Any, List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models import PaymentTransaction, PaymentStatus
+from services.analytics_service import AnalyticsService
+from services.entitlement_service import EntitlementService
 from datetime import datetime
 import logging
+from tracing import tracer
+from deadlines import with_deadline
 
 logger = logging.getLogger(__name__)
 
+# Statuses Stripe can no longer change, so the database answer is final
+TERMINAL_STATUSES = {PaymentStatus.COMPLETED, PaymentStatus.FAILED, PaymentStatus.CANCELLED, PaymentStatus.REFUNDED}
+
 class StripePaymentService:
-    def __init__(self, database: AsyncIOMotorDatabase):
+    def __init__(
+        self,
+        database: AsyncIOMotorDatabase,
+        analytics_service: Optional[AnalyticsService] = None,
+        entitlement_service: Optional[EntitlementService] = None
+    ):
         self.db = database
+        self.analytics_service = analytics_service
+        self.entitlement_service = entitlement_service
         self.api_key = os.getenv("STRIPE_API_KEY", "sk_test_emergent")
+        self.timeout = float(os.getenv("STRIPE_TIMEOUT", "10"))
+        self.status_batch_max = int(os.getenv("PAYMENT_STATUS_BATCH_MAX", "100"))
+        self.status_refresh_concurrency = int(os.getenv("STRIPE_STATUS_CONCURRENCY", "8"))
         
-        # Initialize Stripe checkout
-        self.stripe_checkout = StripeCheckout(
-            api_key=self.api_key,
-            webhook_url=""  # Will be set dynamically
-        )
+        self._stripe_checkout = None
         
         # Product pricing
         self.products = {
@@ -33,6 +46,33 @@ class StripePaymentService:
             }
         }
     
+    @property
+    def stripe_checkout(self):
+        """Stripe checkout client, built on first use; importing the Stripe SDK dominates cold start"""
+        if self._stripe_checkout is None:
+            import stripe
+            from emergentintegrations.payments.stripe.checkout import StripeCheckout
+            
+            # Point the Stripe client at another API host (e.g. stubs.stripe_stub)
+            api_base = os.getenv("STRIPE_API_BASE")
+            if api_base:
+                stripe.api_base = api_base.rstrip("/")
+            
+            # Bound the SDK's own HTTP calls too, not just our wait for them
+            stripe.default_http_client = stripe.new_default_http_client(timeout=self.timeout)
+            
+            self._stripe_checkout = StripeCheckout(
+                api_key=self.api_key,
+                webhook_url=""  # Will be set dynamically
+            )
+        return self._stripe_checkout
+    
+    async def ping(self) -> None:
+        """Cheap authenticated call for the health monitor; raises if Stripe is unreachable"""
+        self.stripe_checkout  # applies the API base and HTTP client settings
+        import stripe
+        await asyncio.to_thread(stripe.Balance.retrieve, api_key=self.api_key)
+    
     async def create_checkout_session(
         self,
         product_type: str,
@@ -48,6 +88,8 @@ class StripePaymentService:
         
         product = self.products[product_type]
         
+        from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest
+        
         # Create checkout session request
         checkout_request = CheckoutSessionRequest(
             amount=product["amount"],
@@ -69,7 +111,8 @@ class StripePaymentService:
         
         try:
             # Create checkout session
-            session = await self.stripe_checkout.create_checkout_session(checkout_request)
+            with tracer.start_span("stripe create_checkout_session", kind="client", attributes={"stripe.product_type": product_type}):
+                session = await with_deadline(self.stripe_checkout.create_checkout_session(checkout_request), "stripe", self.timeout)
             
             # Store payment transaction in database
             transaction = PaymentTransaction(
@@ -107,7 +150,8 @@ class StripePaymentService:
         
         try:
             # Get status from Stripe
-            status = await self.stripe_checkout.get_checkout_status(session_id)
+            with tracer.start_span("stripe get_checkout_status", kind="client", attributes={"stripe.session_id": session_id}):
+                status = await with_deadline(self.stripe_checkout.get_checkout_status(session_id), "stripe", self.timeout)
             
             # Update database record
             update_data = {
@@ -121,15 +165,21 @@ class StripePaymentService:
             elif status.status == "expired":
                 update_data["payment_status"] = PaymentStatus.CANCELLED
             
-            # Update transaction record
-            await self.db.payment_transactions.update_one(
-                {"session_id": session_id},
+            # Update transaction record; only the first observer of a payment completes it
+            query = {"session_id": session_id}
+            if update_data["payment_status"] == PaymentStatus.COMPLETED:
+                query["payment_status"] = {"$ne": PaymentStatus.COMPLETED}
+            result = await self.db.payment_transactions.update_one(
+                query,
                 {"$set": update_data}
             )
             
             # Get updated transaction
             transaction = await self.db.payment_transactions.find_one({"session_id": session_id})
             
+            if update_data["payment_status"] == PaymentStatus.COMPLETED and result.modified_count and transaction:
+                await self._record_completion(transaction)
+            
             return {
                 "session_id": session_id,
                 "payment_status": status.payment_status,
@@ -143,14 +193,71 @@ class StripePaymentService:
             logger.error(f"Failed to get payment status for session {session_id}: {str(e)}")
             raise
     
+    async def get_payment_statuses(self, session_ids: List[str]) -> Dict[str, Any]:
+        """Statuses for many sessions: terminal ones from one database query, pending ones refreshed from Stripe
+        
+        Refreshes update the stored transactions like get_payment_status, but customer
+        onboarding is left to the webhook.
+        """
+        session_ids = list(dict.fromkeys(session_ids))
+        if not session_ids:
+            raise ValueError("session_ids must not be empty")
+        if len(session_ids) > self.status_batch_max:
+            raise ValueError(f"At most {self.status_batch_max} session ids per request")
+        
+        transactions = {
+            doc["session_id"]: doc
+            async for doc in self.db.payment_transactions.find({"session_id": {"$in": session_ids}}, {"_id": 0})
+        }
+        
+        semaphore = asyncio.Semaphore(self.status_refresh_concurrency)
+        
+        async def refresh(session_id: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    result = await self.get_payment_status(session_id)
+                    return self._status_entry(session_id, result.get("transaction") or transactions[session_id], "stripe")
+                except Exception as e:
+                    # Fall back to what we have stored rather than failing the whole batch
+                    entry = self._status_entry(session_id, transactions[session_id], "database")
+                    entry["error"] = f"Stripe refresh failed: {str(e)}"
+                    return entry
+        
+        pending = [session_id for session_id in session_ids if session_id in transactions and transactions[session_id].get("payment_status") not in TERMINAL_STATUSES]
+        refreshed = dict(zip(pending, await asyncio.gather(*[refresh(session_id) for session_id in pending])))
+        
+        results = []
+        for session_id in session_ids:
+            if session_id in refreshed:
+                results.append(refreshed[session_id])
+            elif session_id in transactions:
+                results.append(self._status_entry(session_id, transactions[session_id], "database"))
+            else:
+                results.append({"session_id": session_id, "error": "Session not found"})
+        
+        return {"results": results, "refreshed": len(pending), "from_database": len(transactions) - len(pending)}
+    
+    def _status_entry(self, session_id: str, transaction: Dict[str, Any], source: str) -> Dict[str, Any]:
+        status = transaction.get("payment_status")
+        return {
+            "session_id": session_id,
+            "payment_status": status.value if isinstance(status, PaymentStatus) else status,
+            "amount": transaction.get("amount"),
+            "currency": transaction.get("currency"),
+            "product_name": transaction.get("product_name"),
+            "completed_at": transaction.get("completed_at"),
+            "source": source
+        }
+    
     async def handle_webhook(self, request_body: bytes, signature: str) -> Dict[str, Any]:
         """Handle Stripe webhook events"""
         
         try:
             # Process webhook
-            webhook_response = await self.stripe_checkout.handle_webhook(
-                request_body, signature
-            )
+            with tracer.start_span("stripe handle_webhook", kind="client"):
+                webhook_response = await with_deadline(
+                    self.stripe_checkout.handle_webhook(request_body, signature), "stripe", self.timeout
+                )
             
             # Update database based on webhook event
             if webhook_response.event_type == "checkout.session.completed":
@@ -170,9 +277,9 @@ class StripePaymentService:
         
         session_id = webhook_data.session_id
         
-        # Update transaction status
-        await self.db.payment_transactions.update_one(
-            {"session_id": session_id},
+        # Update transaction status (no-op if a status poll already completed it)
+        result = await self.db.payment_transactions.update_one(
+            {"session_id": session_id, "payment_status": {"$ne": PaymentStatus.COMPLETED}},
             {
                 "$set": {
                     "payment_status": PaymentStatus.COMPLETED,
@@ -184,6 +291,9 @@ class StripePaymentService:
         # Get transaction details for additional processing
         transaction = await self.db.payment_transactions.find_one({"session_id": session_id})
         
+        if transaction and result.modified_count:
+            await self._record_completion(transaction)
+        
         if transaction:
             # Add customer to premium users, send welcome email, etc.
             await self._process_successful_purchase(transaction)
@@ -202,6 +312,13 @@ class StripePaymentService:
             }
         )
     
+    async def _record_completion(self, transaction: Dict[str, Any]) -> None:
+        """Feed a newly completed transaction into the revenue rollups and entitlements"""
+        if self.analytics_service:
+            await self.analytics_service.record_revenue(transaction)
+        if self.entitlement_service:
+            self.entitlement_service.invalidate_user(transaction.get("user_id"))
+    
     async def _process_successful_purchase(self, transaction: Dict[str, Any]) -> None:
         """Process successful purchase - upgrade user, send emails, etc."""
         
@@ -217,6 +334,10 @@ class StripePaymentService:
                 }
             )
         
+        # Premium prompts unlock on the next catalog request
+        if self.entitlement_service:
+            self.entitlement_service.invalidate_user(transaction.get("user_id"))
+        
         logger.info(f"Processed successful purchase for {transaction['email']}")
         
         # Here you would also:
@@ -0,0 +1,124 @@
+import io
+import csv
+import codecs
+import json
+from datetime import datetime, date
+from typing import AsyncIterator, Dict, Any, List, Optional, Sequence
+
+# Header aliases accepted by CSV imports (Google Forms exports use "Email Address" etc.)
+CSV_FIELD_ALIASES = {
+    "email": "email",
+    "email address": "email",
+    "email_address": "email",
+    "first_name": "first_name",
+    "first name": "first_name",
+    "name": "first_name",
+    "magnet_type": "magnet_type",
+    "magnet type": "magnet_type",
+    "source_page": "source_page",
+    "source page": "source_page",
+    "source": "source_page"
+}
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], encoding: str = "utf-8") -> AsyncIterator[str]:
+    """Split a byte stream into text lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    first = True
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if first:
+            text = text.lstrip("\ufeff")
+            first = False
+        pending += text
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Yield one dict per non-empty NDJSON line; malformed lines yield {"__error__": ...}"""
+    async for line in iter_lines(chunks):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield {"__error__": f"Invalid JSON: {str(e)}"}
+            continue
+        yield record if isinstance(record, dict) else {"__error__": "Expected a JSON object"}
+
+
+async def iter_csv_records(chunks: AsyncIterator[bytes], aliases: Optional[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Yield one dict per CSV record, keyed by the (aliased) header row"""
+    aliases = aliases if aliases is not None else CSV_FIELD_ALIASES
+    header: Optional[List[str]] = None
+    record_lines: List[str] = []
+    quotes = 0
+
+    async for line in iter_lines(chunks):
+        # A quoted field may span lines; keep collecting until the quotes balance
+        record_lines.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+
+        row = next(csv.reader(record_lines), [])
+        record_lines, quotes = [], 0
+        if not any(cell.strip() for cell in row):
+            continue
+
+        if header is None:
+            header = [aliases.get(cell.strip().lower(), cell.strip().lower()) for cell in row]
+            continue
+
+        yield {key: value.strip() for key, value in zip(header, row) if value.strip()}
+
+    if record_lines:
+        yield {"__error__": "Unterminated quoted field at end of input"}
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=json_default)
+    return value
+
+
+async def encode_ndjson(docs: AsyncIterator[Dict[str, Any]], fields: Sequence[str]) -> AsyncIterator[bytes]:
+    """Encode documents as NDJSON, one line per document"""
+    async for doc in docs:
+        yield (json.dumps({field: doc.get(field) for field in fields}, default=json_default) + "\n").encode("utf-8")
+
+
+async def encode_csv(docs: AsyncIterator[Dict[str, Any]], fields: Sequence[str], rows_per_chunk: int = 500) -> AsyncIterator[bytes]:
+    """Encode documents as CSV with a header row, flushing every rows_per_chunk rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = 0
+    async for doc in docs:
+        writer.writerow([_csv_value(doc.get(field)) for field in fields])
+        rows += 1
+        if rows % rows_per_chunk == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
@@ -0,0 +1,111 @@
+"""Local stand-in for the ConvertKit v3 endpoints used by ConvertKitService.
+
+Run from the backend directory and point the service at it:
+
+    python -m stubs.convertkit_stub --port 9001 --latency-ms 120 --distribution lognormal --latency-jitter-ms 80
+    CONVERTKIT_API_BASE=http://127.0.0.1:9001/v3
+"""
+import itertools
+import argparse
+from datetime import datetime
+from typing import Dict, Any, Optional
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from stubs.faults import FaultInjector, install_faults, add_fault_arguments, injector_from_args
+
+
+def create_app(injector: Optional[FaultInjector] = None) -> FastAPI:
+    app = FastAPI(title="ConvertKit stub")
+    injector = injector or FaultInjector()
+    install_faults(app, injector)
+
+    ids = itertools.count(1)
+    subscribers: Dict[str, Dict[str, Any]] = {}
+    memberships: Dict[str, set] = {}
+
+    def unauthorized() -> JSONResponse:
+        return JSONResponse(status_code=401, content={"error": "Authorization Failed", "message": "API Key not valid"})
+
+    def upsert_subscriber(payload: Dict[str, Any]) -> Dict[str, Any]:
+        email = payload["email"]
+        subscriber = subscribers.get(email)
+        if subscriber is None:
+            subscriber = {
+                "id": next(ids),
+                "first_name": payload.get("first_name"),
+                "email_address": email,
+                "state": "active",
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "fields": {}
+            }
+            subscribers[email] = subscriber
+        elif payload.get("first_name"):
+            subscriber["first_name"] = payload["first_name"]
+        return subscriber
+
+    async def subscribe(kind: str, resource_id: str, request: Request):
+        payload = await request.json()
+        if not payload.get("api_key"):
+            return unauthorized()
+        if not payload.get("email"):
+            return JSONResponse(status_code=422, content={"error": "Missing parameter", "message": "email is required"})
+
+        subscriber = upsert_subscriber(payload)
+        memberships.setdefault(f"{kind}:{resource_id}", set()).add(subscriber["email_address"])
+        return {
+            "subscription": {
+                "id": next(ids),
+                "state": "active",
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "source": "API::V3::SubscriptionsController (external)",
+                "subscribable_id": resource_id,
+                "subscribable_type": kind,
+                "subscriber": {"id": subscriber["id"]}
+            }
+        }
+
+    @app.get("/v3/forms")
+    async def list_forms(api_key: Optional[str] = None):
+        if not api_key:
+            return unauthorized()
+        forms = {key.split(":", 1)[1] for key in memberships if key.startswith("form:")}
+        return {"forms": [{"id": form_id, "name": f"Form {form_id}", "type": "embed"} for form_id in sorted(forms)]}
+
+    @app.post("/v3/forms/{form_id}/subscribe")
+    async def form_subscribe(form_id: str, request: Request):
+        return await subscribe("form", form_id, request)
+
+    @app.post("/v3/sequences/{sequence_id}/subscribe")
+    async def sequence_subscribe(sequence_id: str, request: Request):
+        return await subscribe("course", sequence_id, request)
+
+    @app.post("/v3/tags/{tag_id}/subscribe")
+    async def tag_subscribe(tag_id: str, request: Request):
+        return await subscribe("tag", tag_id, request)
+
+    @app.get("/v3/subscribers")
+    async def list_subscribers(api_secret: Optional[str] = None, email_address: Optional[str] = None):
+        if not api_secret:
+            return unauthorized()
+        if email_address:
+            matches = [subscribers[email_address]] if email_address in subscribers else []
+        else:
+            matches = list(subscribers.values())
+        return {"total_subscribers": len(matches), "page": 1, "total_pages": 1, "subscribers": matches}
+
+    @app.get("/_stub/memberships")
+    async def list_memberships():
+        return {key: sorted(emails) for key, emails in memberships.items()}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ConvertKit v3 stub server")
+    parser.add_argument("--port", type=int, default=9001)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(injector_from_args(args)), host=args.host, port=args.port, log_level="warning")
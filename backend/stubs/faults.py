@@ -0,0 +1,155 @@
+import time
+import random
+import asyncio
+from typing import Dict, Any, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class FaultInjector:
+    """Latency, error and throttling behaviour shared by the stub servers"""
+
+    distributions = ("fixed", "uniform", "exponential", "lognormal")
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        latency_jitter_ms: float = 0.0,
+        distribution: str = "fixed",
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        rate_limit_rps: float = 0.0,
+        retry_after: int = 1
+    ):
+        self.configure(
+            latency_ms=latency_ms,
+            latency_jitter_ms=latency_jitter_ms,
+            distribution=distribution,
+            error_rate=error_rate,
+            throttle_rate=throttle_rate,
+            rate_limit_rps=rate_limit_rps,
+            retry_after=retry_after
+        )
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0}
+
+    def configure(self, **settings) -> None:
+        if settings.get("distribution", "fixed") not in self.distributions:
+            raise ValueError(f"Unknown latency distribution: {settings['distribution']}")
+        for key, value in settings.items():
+            setattr(self, key, value)
+        self._tokens = float(self.rate_limit_rps or 0)
+        self._last_refill = time.monotonic()
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "latency_ms": self.latency_ms,
+            "latency_jitter_ms": self.latency_jitter_ms,
+            "distribution": self.distribution,
+            "error_rate": self.error_rate,
+            "throttle_rate": self.throttle_rate,
+            "rate_limit_rps": self.rate_limit_rps,
+            "retry_after": self.retry_after
+        }
+
+    def sample_latency(self) -> float:
+        """Draw one response delay in seconds from the configured distribution"""
+        mean = self.latency_ms
+        if self.distribution == "uniform":
+            delay = random.uniform(max(0.0, mean - self.latency_jitter_ms), mean + self.latency_jitter_ms)
+        elif self.distribution == "exponential":
+            delay = random.expovariate(1 / mean) if mean > 0 else 0.0
+        elif self.distribution == "lognormal":
+            # latency_jitter_ms acts as the spread, giving a long right tail
+            sigma = self.latency_jitter_ms / mean if mean > 0 else 0.0
+            delay = random.lognormvariate(0, sigma) * mean if mean > 0 else 0.0
+        else:
+            delay = mean
+        return max(0.0, delay) / 1000
+
+    def _over_rate_limit(self) -> bool:
+        if not self.rate_limit_rps:
+            return False
+        now = time.monotonic()
+        self._tokens = min(float(self.rate_limit_rps), self._tokens + (now - self._last_refill) * self.rate_limit_rps)
+        self._last_refill = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    async def apply(self) -> Optional[JSONResponse]:
+        """Delay the request and return a fault response if one should be injected"""
+        self.stats["requests"] += 1
+
+        delay = self.sample_latency()
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self._over_rate_limit() or random.random() < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": "Too Many Requests", "message": "Rate limit exceeded"},
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        if random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return JSONResponse(
+                status_code=random.choice([500, 502, 503]),
+                content={"error": "Internal Server Error", "message": "Injected fault"}
+            )
+
+        return None
+
+
+def install_faults(app: FastAPI, injector: FaultInjector) -> None:
+    """Apply the injector to every API route and expose /_stub control endpoints"""
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        if request.url.path.startswith("/_stub"):
+            return await call_next(request)
+        fault = await injector.apply()
+        if fault is not None:
+            return fault
+        return await call_next(request)
+
+    @app.get("/_stub/config")
+    async def get_fault_config():
+        return injector.settings()
+
+    @app.post("/_stub/config")
+    async def update_fault_config(settings: Dict[str, Any]):
+        try:
+            injector.configure(**{k: v for k, v in settings.items() if k in injector.settings()})
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        return injector.settings()
+
+    @app.get("/_stub/stats")
+    async def get_fault_stats():
+        return injector.stats
+
+
+def add_fault_arguments(parser) -> None:
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean response latency")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0, help="Spread for uniform/lognormal latency")
+    parser.add_argument("--distribution", choices=FaultInjector.distributions, default="fixed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 5xx")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rate-limit-rps", type=float, default=0.0, help="Token bucket limit before returning 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 responses")
+
+
+def injector_from_args(args) -> FaultInjector:
+    return FaultInjector(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        distribution=args.distribution,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        rate_limit_rps=args.rate_limit_rps,
+        retry_after=args.retry_after
+    )
@@ -0,0 +1,196 @@
+"""Local stand-in for the Stripe Checkout flow used by StripePaymentService.
+
+Implements checkout session create/retrieve and delivers signed
+checkout.session.completed / expired webhooks. Run from the backend directory:
+
+    python -m stubs.stripe_stub --port 9002 --complete-after 2 \\
+        --webhook-url http://127.0.0.1:8001/api/webhook/stripe --webhook-secret whsec_stub
+    STRIPE_API_BASE=http://127.0.0.1:9002
+"""
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+import secrets
+import argparse
+import logging
+from typing import Dict, Any, Optional
+import aiohttp
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from stubs.faults import FaultInjector, install_faults, add_fault_arguments, injector_from_args
+
+logger = logging.getLogger(__name__)
+
+
+def parse_form(form) -> Dict[str, Any]:
+    """Expand Stripe's bracketed form encoding (a[0][b]=c) into nested dicts"""
+    result: Dict[str, Any] = {}
+    for raw_key, value in form.multi_items():
+        parts = raw_key.replace("]", "").split("[")
+        node = result
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return result
+
+
+def sign_payload(payload: str, secret: str) -> str:
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode("utf-8"), f"{timestamp}.{payload}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def create_app(
+    injector: Optional[FaultInjector] = None,
+    webhook_url: Optional[str] = None,
+    webhook_secret: str = "whsec_stub",
+    complete_after: float = 0.0,
+    expire_after: float = 0.0
+) -> FastAPI:
+    app = FastAPI(title="Stripe stub")
+    injector = injector or FaultInjector()
+    install_faults(app, injector)
+
+    sessions: Dict[str, Dict[str, Any]] = {}
+    created_at: Dict[str, float] = {}
+    deliveries = {"sent": 0, "failed": 0}
+
+    def invalid_request(message: str, status_code: int = 400) -> JSONResponse:
+        return JSONResponse(status_code=status_code, content={
+            "error": {"type": "invalid_request_error", "message": message}
+        })
+
+    async def deliver_webhook(event_type: str, session: Dict[str, Any]) -> None:
+        if not webhook_url:
+            return
+        event = {
+            "id": f"evt_{secrets.token_hex(12)}",
+            "object": "event",
+            "type": event_type,
+            "created": int(time.time()),
+            "data": {"object": session}
+        }
+        payload = json.dumps(event)
+        try:
+            async with aiohttp.ClientSession() as http:
+                async with http.post(
+                    webhook_url,
+                    data=payload,
+                    headers={"Content-Type": "application/json", "Stripe-Signature": sign_payload(payload, webhook_secret)}
+                ) as response:
+                    deliveries["sent" if response.status < 400 else "failed"] += 1
+        except Exception as e:
+            deliveries["failed"] += 1
+            logger.error(f"Webhook delivery to {webhook_url} failed: {str(e)}")
+
+    def transition(session: Dict[str, Any], outcome: str) -> None:
+        if session["status"] != "open":
+            return
+        if outcome == "complete":
+            session.update(status="complete", payment_status="paid", payment_intent=f"pi_{secrets.token_hex(12)}")
+            asyncio.create_task(deliver_webhook("checkout.session.completed", session))
+        else:
+            session.update(status="expired")
+            asyncio.create_task(deliver_webhook("checkout.session.expired", session))
+
+    def advance(session_id: str) -> None:
+        """Move a session along its lifecycle based on its age"""
+        session = sessions[session_id]
+        age = time.monotonic() - created_at[session_id]
+        if complete_after and age >= complete_after:
+            transition(session, "complete")
+        elif expire_after and age >= expire_after:
+            transition(session, "expired")
+
+    def authorized(request: Request) -> bool:
+        return request.headers.get("authorization", "").startswith("Bearer sk_")
+
+    @app.post("/v1/checkout/sessions")
+    async def create_session(request: Request):
+        if not authorized(request):
+            return invalid_request("Invalid API Key provided", status_code=401)
+        params = parse_form(await request.form())
+        if not params.get("success_url"):
+            return invalid_request("Missing required param: success_url.")
+
+        line_items = params.get("line_items", {})
+        amount_total = 0
+        currency = params.get("currency", "usd")
+        for item in line_items.values():
+            price_data = item.get("price_data", {})
+            currency = price_data.get("currency", currency)
+            amount_total += int(price_data.get("unit_amount", 0)) * int(item.get("quantity", 1))
+
+        session_id = f"cs_test_{secrets.token_hex(16)}"
+        sessions[session_id] = {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"{request.base_url}pay/{session_id}",
+            "mode": params.get("mode", "payment"),
+            "status": "open",
+            "payment_status": "unpaid",
+            "payment_intent": None,
+            "amount_total": amount_total,
+            "currency": currency,
+            "customer_email": params.get("customer_email"),
+            "success_url": params["success_url"],
+            "cancel_url": params.get("cancel_url"),
+            "metadata": params.get("metadata", {}),
+            "created": int(time.time())
+        }
+        created_at[session_id] = time.monotonic()
+        return sessions[session_id]
+
+    @app.get("/v1/balance")
+    async def retrieve_balance(request: Request):
+        if not authorized(request):
+            return invalid_request("Invalid API Key provided", status_code=401)
+        return {"object": "balance", "available": [{"amount": 0, "currency": "usd"}], "livemode": False, "pending": []}
+
+    @app.get("/v1/checkout/sessions/{session_id}")
+    async def retrieve_session(session_id: str, request: Request):
+        if not authorized(request):
+            return invalid_request("Invalid API Key provided", status_code=401)
+        if session_id not in sessions:
+            return invalid_request(f"No such checkout.session: '{session_id}'", status_code=404)
+        advance(session_id)
+        return sessions[session_id]
+
+    @app.post("/_stub/sessions/{session_id}/{outcome}")
+    async def force_outcome(session_id: str, outcome: str):
+        if session_id not in sessions:
+            return invalid_request(f"No such checkout.session: '{session_id}'", status_code=404)
+        if outcome not in ("complete", "expire"):
+            return invalid_request("Outcome must be 'complete' or 'expire'")
+        transition(sessions[session_id], "complete" if outcome == "complete" else "expired")
+        return sessions[session_id]
+
+    @app.get("/_stub/webhooks")
+    async def webhook_stats():
+        return {"webhook_url": webhook_url, **deliveries}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stripe Checkout stub server")
+    parser.add_argument("--port", type=int, default=9002)
+    parser.add_argument("--webhook-url", help="Where to deliver signed webhook events")
+    parser.add_argument("--webhook-secret", default="whsec_stub", help="Signing secret; match STRIPE_WEBHOOK_SECRET")
+    parser.add_argument("--complete-after", type=float, default=0.0, help="Seconds until a retrieved session is paid (0 = never)")
+    parser.add_argument("--expire-after", type=float, default=0.0, help="Seconds until an unpaid session expires (0 = never)")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    app = create_app(
+        injector_from_args(args),
+        webhook_url=args.webhook_url,
+        webhook_secret=args.webhook_secret,
+        complete_after=args.complete_after,
+        expire_after=args.expire_after
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,346 @@
+import os
+import json
+import time
+import random
+import secrets
+import threading
+import queue
+import urllib.request
+import logging
+from contextvars import ContextVar
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: str = "internal",
+        sampled: bool = True,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.sampled = sampled
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def set_error(self, error: Any) -> None:
+        self.status = "error"
+        self.error = str(error)
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1_000_000
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class SpanExporter:
+    """Base exporter; receives batches of finished spans on the export thread"""
+
+    def export(self, spans: List[Span]) -> None:
+        raise NotImplementedError
+
+
+class FileSpanExporter(SpanExporter):
+    """Append finished spans to a local NDJSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """Post finished spans as OTLP/HTTP JSON to a collector (or a local stand-in)"""
+
+    _kinds = {"internal": 1, "server": 2, "client": 3}
+
+    def __init__(self, endpoint: str, service_name: str):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+
+    def export(self, spans: List[Span]) -> None:
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}}
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "bizpromptai.tracing"},
+                    "spans": [self._encode(span) for span in spans]
+                }]
+            }]
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload, default=str).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=5):
+            pass
+
+    def _encode(self, span: Span) -> Dict[str, Any]:
+        encoded = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": self._kinds.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in span.attributes.items()
+            ],
+            "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1}
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+
+
+class Tracer:
+    def __init__(self):
+        self.service_name = os.getenv("TRACE_SERVICE_NAME", "bizpromptai-backend")
+        self.sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "0.0"))
+        self.batch_size = int(os.getenv("TRACE_EXPORT_BATCH_SIZE", "256"))
+        self.flush_interval = float(os.getenv("TRACE_EXPORT_INTERVAL", "2.0"))
+
+        exporter_name = os.getenv("TRACE_EXPORTER", "file").lower()
+        if exporter_name == "otlp":
+            self.exporter: Optional[SpanExporter] = OTLPHttpSpanExporter(
+                os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318"),
+                self.service_name
+            )
+        elif exporter_name == "file":
+            self.exporter = FileSpanExporter(os.getenv("TRACE_FILE_PATH", "traces.ndjson"))
+        else:
+            self.exporter = None
+
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=10000)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def start_trace(self, name: str, traceparent: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        """Open the root span of a request, continuing an incoming W3C traceparent if present"""
+        trace_id, parent_id, sampled = None, None, None
+        if traceparent:
+            parts = traceparent.split("-")
+            if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+                trace_id, parent_id, sampled = parts[1], parts[2], parts[3] == "01"
+
+        if sampled is None:
+            sampled = self.enabled and random.random() < self.sample_rate
+
+        span = Span(
+            name,
+            trace_id=trace_id or secrets.token_hex(16),
+            parent_id=parent_id,
+            kind="server",
+            sampled=sampled and self.enabled,
+            attributes=attributes
+        )
+        with self._activate(span):
+            yield span
+
+    @contextmanager
+    def start_span(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None):
+        """Open a child span of the current span; a no-op outside a sampled trace"""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            yield Span(name, trace_id=parent.trace_id if parent else "", sampled=False)
+            return
+
+        span = Span(name, trace_id=parent.trace_id, parent_id=parent.span_id, kind=kind, attributes=attributes)
+        with self._activate(span):
+            yield span
+
+    @contextmanager
+    def _activate(self, span: Span):
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if not span.sampled or self.exporter is None:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def shutdown(self) -> None:
+        """Flush queued spans and stop the export thread"""
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join(timeout=5)
+            self._worker = None
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._export_loop, name="span-exporter", daemon=True)
+                self._worker.start()
+
+    def _export_loop(self) -> None:
+        batch: List[Span] = []
+        running = True
+        while running:
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    span = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if span is None:
+                    running = False
+                    break
+                batch.append(span)
+
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception as e:
+                    logger.error(f"Span export failed: {str(e)}")
+                batch = []
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """pymongo command listener that records a client span for each Motor command"""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans: Dict[Any, Span] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event) -> None:
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            return
+        span = Span(
+            f"mongo {event.command_name}",
+            trace_id=parent.trace_id,
+            parent_id=parent.span_id,
+            kind="client",
+            attributes={
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.collection": event.command.get(event.command_name)
+            }
+        )
+        with self._lock:
+            self._spans[(event.request_id, event.connection_id)] = span
+
+    def succeeded(self, event) -> None:
+        self._finish(event)
+
+    def failed(self, event) -> None:
+        self._finish(event, error=event.failure)
+
+    def _finish(self, event, error: Any = None) -> None:
+        with self._lock:
+            span = self._spans.pop((event.request_id, event.connection_id), None)
+        if span is None:
+            return
+        if error is not None:
+            span.set_error(error)
+        self.tracer.finish(span)
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens a root span per HTTP request"""
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1") or None
+        name = f"{scope['method']} {scope['path']}"
+
+        with self.tracer.start_trace(name, traceparent, {"http.method": scope["method"], "http.target": scope["path"]}) as span:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.status = "error"
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-trace-id", span.trace_id.encode("latin-1"))]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
+
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                span.name = f"{scope['method']} {route.path}"
+
+
+tracer = Tracer()
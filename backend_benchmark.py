@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import math
+import uuid
+import random
+import asyncio
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Callable, Awaitable
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class BizPromptAIBenchmark:
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        concurrency: int = 20,
+        duration: float = 30.0,
+        mix: Optional[Dict[str, int]] = None,
+        lead_burst: int = 10,
+        status_polls: int = 3,
+        timeout: float = 10.0
+    ):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.duration = duration
+        self.lead_burst = lead_burst
+        self.status_polls = status_polls
+        self.timeout = timeout
+        self.mix = mix or {"browse": 5, "lead_magnet": 3, "auth": 1, "checkout": 1}
+
+        self.scenarios: Dict[str, Callable[[httpx.AsyncClient], Awaitable[None]]] = {
+            "auth": self.scenario_auth,
+            "lead_magnet": self.scenario_lead_magnet,
+            "checkout": self.scenario_checkout,
+            "browse": self.scenario_browse
+        }
+        unknown = set(self.mix) - set(self.scenarios)
+        if unknown:
+            raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.scenario_counts: Dict[str, int] = {}
+
+    async def request(self, client: httpx.AsyncClient, method: str, endpoint: str, path: Optional[str] = None, **kwargs) -> Optional[httpx.Response]:
+        """Issue one request and record its latency under the endpoint template"""
+        key = f"{method} {endpoint}"
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path or endpoint, **kwargs)
+        except Exception:
+            response = None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self.latencies.setdefault(key, []).append(elapsed_ms)
+        if response is None or response.status_code >= 400:
+            self.errors[key] = self.errors.get(key, 0) + 1
+        return response
+
+    async def scenario_auth(self, client: httpx.AsyncClient) -> None:
+        """Register a fresh user, then log in with the same credentials"""
+        email = f"bench_{uuid.uuid4().hex[:12]}@example.com"
+        password = "BenchPass123!"
+        await self.request(client, "POST", "/api/auth/register", json={
+            "email": email,
+            "password": password,
+            "name": "Bench User"
+        })
+        await self.request(client, "POST", "/api/auth/login", json={"email": email, "password": password})
+
+    async def scenario_lead_magnet(self, client: httpx.AsyncClient) -> None:
+        """Burst of lead magnet signups, as during a campaign launch"""
+        await asyncio.gather(*[
+            self.request(client, "POST", "/api/lead-magnet", json={
+                "email": f"lead_{uuid.uuid4().hex[:12]}@example.com",
+                "first_name": "Lead",
+                "magnet_type": "ai_prompts_guide",
+                "source_page": "benchmark"
+            })
+            for _ in range(self.lead_burst)
+        ])
+
+    async def scenario_checkout(self, client: httpx.AsyncClient) -> None:
+        """Create a checkout session and poll its status like the success page does"""
+        response = await self.request(client, "POST", "/api/payments/create-checkout", json={
+            "product_type": random.choice(["presale", "regular"]),
+            "success_url": "http://localhost:3000/success",
+            "cancel_url": "http://localhost:3000/"
+        })
+        if response is None or response.status_code != 200:
+            return
+        session_id = response.json().get("session_id")
+        for _ in range(self.status_polls):
+            await self.request(
+                client, "GET", "/api/payments/status/{session_id}",
+                path=f"/api/payments/status/{session_id}"
+            )
+
+    async def scenario_browse(self, client: httpx.AsyncClient) -> None:
+        """Browse the prompt library, unfiltered and by category"""
+        await self.request(client, "GET", "/api/prompts")
+        await self.request(client, "GET", "/api/prompts?category={category}", path="/api/prompts", params={
+            "category": random.choice(["Marketing", "Social Media", "Operations"])
+        })
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: float) -> None:
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights=weights)[0]
+            self.scenario_counts[name] = self.scenario_counts.get(name, 0) + 1
+            await self.scenarios[name](client)
+
+    async def _drive(self, client: httpx.AsyncClient) -> float:
+        start = time.perf_counter()
+        deadline = start + self.duration
+        await asyncio.gather(*[self._worker(client, deadline) for _ in range(self.concurrency)])
+        return time.perf_counter() - start
+
+    async def run(self) -> Dict[str, Any]:
+        """Run the configured scenario mix and return the report"""
+        limits = httpx.Limits(max_connections=self.concurrency * 2)
+        if self.base_url:
+            target = self.base_url
+            async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+                elapsed = await self._drive(client)
+        else:
+            # Drive the FastAPI app in-process, including its lifespan. The auth and lead_magnet
+            # scenarios burst from one client IP, which the rate limiter would answer with 429s.
+            os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+            sys.path.insert(0, BACKEND_DIR)
+            from server import app
+
+            target = "in-process"
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=self.timeout) as client:
+                    elapsed = await self._drive(client)
+
+        return self.report(target, elapsed)
+
+    def report(self, target: str, elapsed: float) -> Dict[str, Any]:
+        """Summarize throughput and latency percentiles per endpoint"""
+        endpoints = {}
+        total_requests = 0
+        total_errors = 0
+        for key, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            errors = self.errors.get(key, 0)
+            total_requests += len(values)
+            total_errors += errors
+            endpoints[key] = {
+                "requests": len(values),
+                "errors": errors,
+                "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0,
+                "mean_ms": round(sum(values) / len(values), 2),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "max_ms": round(values[-1], 2)
+            }
+
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "target": target,
+            "config": {
+                "concurrency": self.concurrency,
+                "duration_s": self.duration,
+                "mix": self.mix,
+                "lead_burst": self.lead_burst,
+                "status_polls": self.status_polls
+            },
+            "elapsed_s": round(elapsed, 3),
+            "total_requests": total_requests,
+            "total_errors": total_errors,
+            "throughput_rps": round(total_requests / elapsed, 2) if elapsed else 0,
+            "scenarios": self.scenario_counts,
+            "endpoints": endpoints
+        }
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    print(f"📊 {results['total_requests']} requests in {results['elapsed_s']}s "
+          f"({results['throughput_rps']} req/s, {results['total_errors']} errors) against {results['target']}")
+    print(f"{'endpoint':<48} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for key, stats in results["endpoints"].items():
+        line = (f"{key:<48} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8} "
+                f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+        previous = (baseline or {}).get("endpoints", {}).get(key)
+        if previous and previous["p95_ms"]:
+            delta = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+            line += f"  p95 {delta:+.1f}% vs baseline"
+        print(line)
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """Parse a scenario mix such as 'browse=5,lead_magnet=3,auth=1'"""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BizPromptAI backend load test and benchmark")
+    parser.add_argument("--base-url", help="Benchmark a running server (e.g. http://localhost:8001) instead of in-process; start it with RATE_LIMIT_ENABLED=false or auth and lead_magnet requests are rate limited")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--mix", type=parse_mix, default=None, help="Scenario weights, e.g. browse=5,lead_magnet=3,auth=1,checkout=1")
+    parser.add_argument("--lead-burst", type=int, default=10, help="Signups per lead_magnet scenario")
+    parser.add_argument("--status-polls", type=int, default=3, help="Status polls per checkout scenario")
+    parser.add_argument("--output", default=f"test_reports/benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    parser.add_argument("--compare", help="Previous results JSON to compare p95 latencies against")
+    args = parser.parse_args()
+
+    benchmark = BizPromptAIBenchmark(
+        base_url=args.base_url,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        mix=args.mix,
+        lead_burst=args.lead_burst,
+        status_polls=args.status_polls
+    )
+    results = asyncio.run(benchmark.run())
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {args.output}")
+
+    return 0 if results["total_errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())